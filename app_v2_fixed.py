@@ -8,6 +8,14 @@ from altair import Axis, Scale, Tooltip, X, Y, Color
 from typing import List, Dict, Tuple, Optional
 import os
 
+from catalog_db import DEFAULT_DB, read_catalog, select_positions
+from catalog_store import (QUANTILE_LEVELS, apply_catalog_schema, load_catalog, open_strain_matrix, quantile_column,
+                           exact_analytes, read_snapshot, share_analyte_columns)
+from strain_engine import build_score_matrix, format_bonus_label, match_bonus_rules, score_strains, top_k_indices
+from strain_index import (STRAIN_ALIASES, AnalyteRangeIndex, FuzzyNameIndex, NameIndex, RangePredicate, SortIndex,
+                          TagIndex, split_tags)
+from strain_names import read_alias_map
+
 # Page configuration
 st.set_page_config(
     page_title="StrainMatch Pro | Cannabis Recommendation Engine",
@@ -870,26 +878,145 @@ CANNABINOID_INFO = {
 # DATA LOADING
 # ============================================================================
 
-@st.cache_data
+# Catalog backend: 'csv' (default) or 'sqlite' - the STRAINMATCH_DB file built by catalog_db.py,
+# where search, filters and sort run as indexed SQL queries
+CATALOG_BACKEND = os.environ.get('STRAINMATCH_BACKEND', 'csv').lower()
+CATALOG_PATH = (os.environ.get('STRAINMATCH_DB', DEFAULT_DB) if CATALOG_BACKEND == 'sqlite'
+                else 'strain_database_enhanced_v2.csv')
+QUANTILES_PATH = 'strain_database_lab_quantiles.npz'
+ALIASES_PATH = 'strain_aliases.csv'
+
+# Browse tab sort options -> (column, ascending)
+BROWSE_SORTS = {
+    "Name (A-Z)": ('strain_name', True),
+    "THC (High→Low)": ('thc_percent', False),
+    "CBD (High→Low)": ('cbd_percent', False),
+}
+
+def catalog_signature(path: str = CATALOG_PATH) -> Tuple[int, int]:
+    """Modification time and size of the catalog file - cache key for everything derived from it"""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+def _parse_strain_data(path: str) -> pd.DataFrame:
+    """Catalog with derived columns as stored (float64 analytes), from the selected backend"""
+    if CATALOG_BACKEND == 'sqlite':
+        return read_catalog(path)
+    # Typed snapshot when it matches the CSV, otherwise parse the CSV
+    return load_catalog(path)
+
+# Shared (cache_resource) handles, no per-hit pickling. The analyte matrix is a memory-mapped
+# file shared by every worker process on the host, and the catalog frame's analyte columns are
+# views of it; each process privately holds only the frame's label/text columns and the indexes.
+# Callers must not modify the returned objects in place (the mapped columns are read-only).
+@st.cache_resource(max_entries=1)
+def _catalog_handles(path: str, signature: Tuple[int, int]) -> Tuple[pd.DataFrame, np.ndarray]:
+    """(catalog with derived columns and compact dtypes, float64 analyte matrix of the stored values)
+
+    Both matrices are memory-mapped; the float64 one is only read a few rows
+    at a time (match explanations), so only those pages become resident.
+    """
+    df = _parse_strain_data(path)
+    exact = open_strain_matrix(path, df, dtype=np.float64)
+    df = apply_catalog_schema(df)
+    # The parsed analyte columns are dropped here in favour of views of the shared matrix
+    return share_analyte_columns(df, open_strain_matrix(path, df)), exact
+
+def _read_strain_data(path: str, signature: Tuple[int, int]) -> pd.DataFrame:
+    """Load the catalog with derived columns (re-run only when the signature changes)"""
+    return _catalog_handles(path, signature)[0]
+
 def load_strain_data() -> pd.DataFrame:
     """Load the enhanced strain database"""
-    enhanced_path = 'strain_database_enhanced_v2.csv'
-    
-    if not os.path.exists(enhanced_path):
-        st.error("❌ Database not found! Please ensure strain_database_enhanced_v2.csv exists.")
+    if not os.path.exists(CATALOG_PATH):
+        st.error(f"❌ Database not found! Please ensure {CATALOG_PATH} exists.")
         st.stop()
     
-    df = pd.read_csv(enhanced_path)
-    
-    # Calculate total terpene content
-    terp_cols = ['myrcene', 'limonene', 'caryophyllene', 'linalool', 'pinene', 'humulene', 'terpinolene', 'ocimene']
-    available_terps = [col for col in terp_cols if col in df.columns]
-    df['total_terpenes'] = df[available_terps].sum(axis=1)
-    
-    # Identify dominant terpene
-    df['dominant_terpene'] = df[available_terps].idxmax(axis=1)
-    
-    return df
+    return _read_strain_data(CATALOG_PATH, catalog_signature())
+
+def load_exact_matrix() -> np.ndarray:
+    """Analyte matrix of the current catalog at float64, values exactly as stored"""
+    return _catalog_handles(CATALOG_PATH, catalog_signature())[1]
+
+@st.cache_resource(max_entries=1)
+def _shared_strain_matrix(path: str, signature: Tuple[int, int]) -> np.ndarray:
+    """Memory-mapped analyte matrix, shared read-only across worker processes"""
+    return open_strain_matrix(path, _read_strain_data(path, signature))
+
+@st.cache_resource(max_entries=1)
+def _score_all_symptoms(path: str, signature: Tuple[int, int]) -> pd.DataFrame:
+    """Strains x symptoms match_score table for one version of the catalog"""
+    return build_score_matrix(_read_strain_data(path, signature), SYMPTOM_PROFILES,
+                              matrix=_shared_strain_matrix(path, signature))
+
+def load_score_matrix() -> pd.DataFrame:
+    """Precomputed match scores for every symptom profile, invalidated with the catalog"""
+    return _score_all_symptoms(CATALOG_PATH, catalog_signature())
+
+@st.cache_resource(max_entries=1)
+def _build_name_index(path: str, signature: Tuple[int, int]) -> NameIndex:
+    """Name search index for one version of the catalog"""
+    return NameIndex(_read_strain_data(path, signature)['strain_name'])
+
+def load_name_index() -> NameIndex:
+    """Substring search index over strain names, rebuilt with the catalog"""
+    return _build_name_index(CATALOG_PATH, catalog_signature())
+
+@st.cache_resource(max_entries=1)
+def _build_fuzzy_index(path: str, signature: Tuple[int, int],
+                       alias_signature: Optional[Tuple[int, int]] = None) -> FuzzyNameIndex:
+    """Typo-tolerant name index for one version of the catalog (and of the lab alias map)"""
+    aliases = dict(STRAIN_ALIASES)
+    if alias_signature is not None:
+        aliases.update(read_alias_map(ALIASES_PATH))
+    return FuzzyNameIndex(_read_strain_data(path, signature)['strain_name'], aliases)
+
+def load_fuzzy_index() -> FuzzyNameIndex:
+    """Misspelling and alias lookup over strain names, rebuilt with the catalog or alias map"""
+    alias_signature = catalog_signature(ALIASES_PATH) if os.path.exists(ALIASES_PATH) else None
+    return _build_fuzzy_index(CATALOG_PATH, catalog_signature(), alias_signature)
+
+@st.cache_resource(max_entries=1)
+def _build_tag_index(path: str, signature: Tuple[int, int]) -> TagIndex:
+    """Effect / medical-use / type bitsets for one version of the catalog"""
+    return TagIndex(_read_strain_data(path, signature))
+
+def load_tag_index() -> TagIndex:
+    """Tag bitmap index over the catalog, rebuilt with the catalog"""
+    return _build_tag_index(CATALOG_PATH, catalog_signature())
+
+@st.cache_resource(max_entries=1)
+def _build_sort_index(path: str, signature: Tuple[int, int]) -> SortIndex:
+    """Browse sort permutations for one version of the catalog"""
+    return SortIndex(_read_strain_data(path, signature), list(BROWSE_SORTS.values()))
+
+def load_sort_index() -> SortIndex:
+    """Precomputed Browse tab sort orders, rebuilt with the catalog"""
+    return _build_sort_index(CATALOG_PATH, catalog_signature())
+
+@st.cache_resource(max_entries=1)
+def _build_range_index(path: str, signature: Tuple[int, int]) -> AnalyteRangeIndex:
+    """Sorted analyte columns for one version of the catalog"""
+    return AnalyteRangeIndex(_shared_strain_matrix(path, signature))
+
+def load_range_index() -> AnalyteRangeIndex:
+    """Range-predicate index over the analyte matrix, rebuilt with the catalog"""
+    return _build_range_index(CATALOG_PATH, catalog_signature())
+
+@st.cache_resource(max_entries=1)
+def _read_lab_quantiles(path: str, signature: Tuple[int, int]) -> Optional[pd.DataFrame]:
+    """Lab quantile table indexed by lowercased strain name"""
+    table = read_snapshot(path)
+    if table is None:
+        return None
+    table.index = table['strain_name'].str.lower()
+    return table[~table.index.duplicated()]
+
+def load_lab_quantiles() -> Optional[pd.DataFrame]:
+    """Median and p10/p90 bands from the lab ETL, or None when it has not been run"""
+    if not os.path.exists(QUANTILES_PATH):
+        return None
+    return _read_lab_quantiles(QUANTILES_PATH, catalog_signature(QUANTILES_PATH))
 
 def calculate_strain_score(strain: pd.Series, symptom_profile: Dict) -> Tuple[float, Dict]:
     """Calculate how well a strain matches the target profile"""
@@ -905,7 +1032,9 @@ def calculate_strain_score(strain: pd.Series, symptom_profile: Dict) -> Tuple[fl
         
         strain_value = strain.get(terp, 0)
         if strain_value >= min_threshold:
-            terp_score = weight * 100 * min(1.5, (strain_value / min_threshold))
+            # A zero threshold is always met - award the capped ratio
+            ratio = strain_value / min_threshold if min_threshold > 0 else 1.5
+            terp_score = weight * 100 * min(1.5, ratio)
             score += terp_score
             details["terpenes"][terp] = {"status": "excellent", "value": strain_value, "target": min_threshold}
         elif strain_value >= min_threshold * 0.5:
@@ -966,93 +1095,98 @@ def calculate_strain_score(strain: pd.Series, symptom_profile: Dict) -> Tuple[fl
     else:
         max_score += 15
     
-    # Entourage effect bonuses
-    if strain.get('thc_percent', 0) > 10 and strain.get('cbd_percent', 0) > 0.5:
-        score += 8
-        max_score += 8
-        details["bonuses"].append("✓ THC+CBD entourage (anxiety reduction)")
-    else:
-        max_score += 8
-    
-    if strain.get('thc_percent', 0) > 12 and strain.get('myrcene', 0) > 0.005:
-        score += 7
-        max_score += 7
-        details["bonuses"].append("✓ THC+Myrcene entourage (sedation boost)")
-    else:
-        max_score += 7
-    
-    if strain.get('cbd_percent', 0) > 1.0 and strain.get('caryophyllene', 0) > 0.004:
-        score += 10
-        max_score += 10
-        details["bonuses"].append("✓ CBD+Caryophyllene (anti-inflammatory power)")
-    else:
-        max_score += 10
-    
-    if strain.get('limonene', 0) > 0.003 and strain.get('linalool', 0) > 0.004:
-        score += 6
-        max_score += 6
-        details["bonuses"].append("✓ Limonene+Linalool (calm + uplift)")
-    else:
-        max_score += 6
-    
-    if strain.get('cbg_percent', 0) > 0.3 and strain.get('cbc_percent', 0) > 0.15:
-        score += 5
-        max_score += 5
-        details["bonuses"].append("✓ CBG+CBC (brain health synergy)")
-    else:
-        max_score += 5
-    
-    if strain.get('thc_percent', 0) > 15 and strain.get('pinene', 0) > 0.003:
-        score += 4
-        max_score += 4
-        details["bonuses"].append("✓ THC+Pinene (counteracts memory loss)")
-    else:
-        max_score += 4
-    
-    # High terpene content bonus
-    total_terps = strain.get('total_terpenes', 0)
-    if total_terps > 0.02:
-        score += 8
-        max_score += 8
-        details["bonuses"].append(f"✓ Rich terpene profile ({total_terps*100:.2f}% total)")
-    elif total_terps > 0.01:
-        score += 4
-        max_score += 8
-        details["bonuses"].append(f"✓ Good terpene content ({total_terps*100:.2f}%)")
-    else:
-        max_score += 8
+    # Entourage effect and terpene content bonuses (BONUS_RULES table in strain_engine)
+    for group_max, rule in match_bonus_rules(strain):
+        max_score += group_max
+        if rule is not None:
+            score += rule['points']
+            details["bonuses"].append(format_bonus_label(rule, strain))
     
     # Normalize to 0-100
     normalized_score = min(100, (score / max_score) * 100) if max_score > 0 else 0
     
     return normalized_score, details
 
-def get_recommendations(symptom: str, df: pd.DataFrame, top_n: int = 6) -> pd.DataFrame:
-    """Get top strain recommendations"""
+def get_recommendations(symptom: str, df: pd.DataFrame, top_n: int = 6,
+                        score_matrix: Optional[pd.DataFrame] = None,
+                        candidates: Optional[np.ndarray] = None,
+                        exact: Optional[np.ndarray] = None) -> pd.DataFrame:
+    """Get top strain recommendations (only among the candidate row positions, if given)
+
+    With exact (float64 analyte matrix of df), explanations test the bonus
+    thresholds on the values as stored rather than on df's float32 columns.
+    """
     if symptom not in SYMPTOM_PROFILES:
         return pd.DataFrame()
     
     symptom_profile = SYMPTOM_PROFILES[symptom]
     
-    scores = []
-    details_list = []
-    for idx, strain in df.iterrows():
-        score, details = calculate_strain_score(strain, symptom_profile)
-        scores.append(score)
-        details_list.append(details)
+    # Precomputed column when available, otherwise vectorized scoring over the whole catalog
+    if candidates is None:
+        candidates = np.arange(len(df))
+    if score_matrix is not None and symptom in score_matrix.columns:
+        scores = score_matrix[symptom].to_numpy()[candidates]
+    else:
+        scores = score_strains(df.iloc[candidates], symptom_profile)
     
-    df_copy = df.copy()
-    df_copy['match_score'] = scores
-    df_copy['match_details'] = details_list
+    # Select the best rows straight from the score array and materialize only those
+    best = top_k_indices(scores, df['strain_name'].to_numpy()[candidates], top_n)
+    top_matches = df.iloc[candidates[best]].assign(match_score=scores[best])
     
-    return df_copy.nlargest(top_n, 'match_score')
-
-def search_strains(df: pd.DataFrame, query: str) -> pd.DataFrame:
-    """Search strains by name"""
-    if not query:
-        return df
-    query_lower = query.lower()
-    return df[df['strain_name'].str.lower().str.contains(query_lower, na=False)]
+    # Explanations are only built for the strains actually shown
+    explained = exact_analytes(top_matches, exact, candidates[best]) if exact is not None else top_matches
+    top_matches['match_details'] = [
+        calculate_strain_score(strain, symptom_profile)[1] for idx, strain in explained.iterrows()
+    ]
+    
+    return top_matches
+
+def lab_range_filters(key: str) -> List[RangePredicate]:
+    """Optional lab-value limits as range predicates (terpene % converted to the stored fraction)"""
+    with st.expander("🧪 Lab Value Limits", expanded=False):
+        col_thc, col_cbd, col_terp, col_terp_min = st.columns(4)
+        with col_thc:
+            thc_max = st.number_input("Max THC %", 0.0, 50.0, 50.0, 0.5, key=f"{key}_thc_max")
+        with col_cbd:
+            cbd_min = st.number_input("Min CBD %", 0.0, 30.0, 0.0, 0.5, key=f"{key}_cbd_min")
+        with col_terp:
+            terpene = st.selectbox("Terpene", ["Any"] + list(TERPENE_INFO), key=f"{key}_terpene",
+                                   format_func=lambda t: TERPENE_INFO[t]['name'] if t in TERPENE_INFO else t)
+        with col_terp_min:
+            terpene_min = st.number_input("Min Terpene %", 0.0, 10.0, 0.0, 0.1, key=f"{key}_terpene_min")
+    
+    predicates = []
+    if thc_max < 50.0:
+        predicates.append(('thc_percent', '<=', thc_max))
+    if cbd_min > 0:
+        predicates.append(('cbd_percent', '>=', cbd_min))
+    if terpene != "Any" and terpene_min > 0:
+        predicates.append((terpene, '>=', terpene_min / 100))
+    return predicates
+
+def lab_spread(strain: pd.Series, quantiles: Optional[pd.DataFrame]) -> Optional[str]:
+    """THC/CBD median with p10-p90 band across lab batches, None without lab data for the strain"""
+    key = str(strain['strain_name']).lower()
+    if quantiles is None or key not in quantiles.index:
+        return None
+    row = quantiles.loc[key]
+    parts = []
+    for col, label in (('thc_percent', 'THC'), ('cbd_percent', 'CBD')):
+        low, median, high = (row.get(quantile_column(col, level), np.nan) for level in QUANTILE_LEVELS)
+        if pd.notna(median):
+            parts.append(f"{label} median {median:.1f}% (p10–p90: {low:.1f}–{high:.1f}%)")
+    return "🧪 Across lab batches: " + " · ".join(parts) if parts else None
+
+def search_positions(query: str, name_index: NameIndex, fuzzy_index: FuzzyNameIndex) -> Tuple[np.ndarray, bool]:
+    """Catalog row positions matching a name query, and whether they came from the fuzzy fallback"""
+    positions = name_index.search(query)
+    if len(positions) > 0:
+        return positions, False
+    return fuzzy_positions(query, fuzzy_index), True
+
+def fuzzy_positions(query: str, fuzzy_index: FuzzyNameIndex) -> np.ndarray:
+    """Catalog row positions of the closest names to a misspelled or aliased query"""
+    return np.array([pos for pos, _ in fuzzy_index.lookup(query)], dtype=np.int32)
 
 # ============================================================================
 # VISUALIZATION
@@ -1108,7 +1242,8 @@ def create_terpene_radar(strain: pd.Series) -> Optional[alt.Chart]:
     
     return chart
 
-def render_strain_card(strain: pd.Series, rank: int):
+def render_strain_card(strain: pd.Series, rank: int, tag_index: Optional[TagIndex] = None,
+                       quantiles: Optional[pd.DataFrame] = None):
     """Render strain recommendation card"""
     score = strain['match_score']
     
@@ -1166,6 +1301,11 @@ def render_strain_card(strain: pd.Series, rank: int):
         cbc = strain.get('cbc_percent', 0)
         st.metric("CBC", f"{cbc:.2f}%", help="Cannabichromene: Non-intoxicating, binds to TRPV1 and TRPA1 receptors. Anti-inflammatory via COX-2 inhibition, increases neurogenesis and anandamide.")
     
+    # Batch spread from the lab quantile sketches - robust to single outlier batches
+    spread = lab_spread(strain, quantiles)
+    if spread:
+        st.caption(spread)
+    
     # Terpene visualization
     with st.expander("🧬 Terpene Profile & Effects", expanded=True):
         col_chart, col_info = st.columns([2, 1])
@@ -1193,14 +1333,14 @@ def render_strain_card(strain: pd.Series, rank: int):
     
     with col_effects:
         st.markdown("**🎭 Primary Effects**")
-        effects = strain.get('primary_effects', '').split(',')
-        effects_html = ' '.join([f'<span class="effect-tag">{e.strip()}</span>' for e in effects if e.strip()])
+        effects = tag_index.tags('effect', strain.get('primary_effects')) if tag_index else split_tags(strain.get('primary_effects'))
+        effects_html = ' '.join([f'<span class="effect-tag">{e}</span>' for e in effects])
         st.markdown(effects_html, unsafe_allow_html=True)
     
     with col_uses:
         st.markdown("**💊 Medical Uses**")
-        uses = strain.get('medical_uses', '').split(',')
-        uses_html = ' '.join([f'<span class="effect-tag">{u.strip()}</span>' for u in uses if u.strip()])
+        uses = tag_index.tags('use', strain.get('medical_uses')) if tag_index else split_tags(strain.get('medical_uses'))
+        uses_html = ' '.join([f'<span class="effect-tag">{u}</span>' for u in uses])
         st.markdown(uses_html, unsafe_allow_html=True)
     
     # Data source
@@ -1216,6 +1356,15 @@ def render_strain_card(strain: pd.Series, rank: int):
 def main():
     # Load data
     df = load_strain_data()
+    score_matrix = load_score_matrix()
+    fuzzy_index = load_fuzzy_index()
+    tag_index = load_tag_index()
+    quantiles = load_lab_quantiles()
+    # The SQLite backend answers name search, range filters and sorting itself
+    in_memory = CATALOG_BACKEND != 'sqlite'
+    name_index = load_name_index() if in_memory else None
+    sort_index = load_sort_index() if in_memory else None
+    range_index = load_range_index() if in_memory else None
     
     # Header
     st.markdown("""
@@ -1300,12 +1449,20 @@ def main():
             st.markdown("---")
             st.markdown("## 🏆 Top Matches")
             
-            # Get recommendations
-            recommendations = get_recommendations(selected_symptom, df, top_n=6)
+            # Get recommendations (lab limits narrow the candidates before ranking)
+            limits = lab_range_filters("find")
+            if not limits:
+                candidates = None
+            elif CATALOG_BACKEND == 'sqlite':
+                candidates = select_positions(CATALOG_PATH, ranges=limits)
+            else:
+                candidates = range_index.select(limits)
+            recommendations = get_recommendations(selected_symptom, df, top_n=6, score_matrix=score_matrix,
+                                                  candidates=candidates, exact=load_exact_matrix())
             
             if not recommendations.empty:
                 for rank, (idx, strain) in enumerate(recommendations.iterrows(), 1):
-                    render_strain_card(strain, rank)
+                    render_strain_card(strain, rank, tag_index, quantiles)
             else:
                 st.warning("No strains found matching this profile.")
     
@@ -1323,29 +1480,56 @@ def main():
             type_filter = st.selectbox("Strain Type", ["All", "Indica", "Sativa", "Hybrid"])
         
         with col_sort:
-            sort_by = st.selectbox("Sort By", ["Name (A-Z)", "THC (High→Low)", "CBD (High→Low)"])
+            sort_by = st.selectbox("Sort By", list(BROWSE_SORTS))
+        
+        col_effects, col_uses, col_exclude = st.columns(3)
+        
+        with col_effects:
+            effect_filter = st.multiselect("Effects (all of)", tag_index.vocabulary.get('effect', []))
         
-        # Apply filters
-        filtered_df = df.copy()
+        with col_uses:
+            use_filter = st.multiselect("Medical Uses (all of)", tag_index.vocabulary.get('use', []))
         
-        if search_query:
-            filtered_df = search_strains(filtered_df, search_query)
+        with col_exclude:
+            exclude_types = st.multiselect("Exclude Types", tag_index.vocabulary.get('type', []))
         
+        required = [('effect', tag) for tag in effect_filter] + [('use', tag) for tag in use_filter]
         if type_filter != "All":
-            filtered_df = filtered_df[filtered_df['strain_type'] == type_filter]
+            required.append(('type', type_filter))
+        excluded = [('type', tag) for tag in exclude_types]
+        limits = lab_range_filters("browse")
         
-        # Apply sorting
-        if sort_by == "Name (A-Z)":
-            filtered_df = filtered_df.sort_values('strain_name')
-        elif sort_by == "THC (High→Low)":
-            filtered_df = filtered_df.sort_values('thc_percent', ascending=False)
-        elif sort_by == "CBD (High→Low)":
-            filtered_df = filtered_df.sort_values('cbd_percent', ascending=False)
+        if CATALOG_BACKEND == 'sqlite':
+            # Name, facet and range filters plus the sort as one query over the indexed tables
+            positions = select_positions(CATALOG_PATH, name=search_query, all_of=required, none_of=excluded,
+                                         ranges=limits, order_by=BROWSE_SORTS[sort_by])
+            if search_query and len(positions) == 0 and len(select_positions(CATALOG_PATH, name=search_query)) == 0:
+                hits = fuzzy_positions(search_query, fuzzy_index)
+                if len(hits) > 0:
+                    st.caption(f"No strain name contains \"{search_query}\" - showing closest matches")
+                positions = select_positions(CATALOG_PATH, all_of=required, none_of=excluded, ranges=limits,
+                                             order_by=BROWSE_SORTS[sort_by], within=hits)
+        else:
+            # Tag facets as one bitset query over the whole catalog
+            facet_mask = tag_index.select(all_of=required, none_of=excluded)
+            if limits:
+                facet_mask &= range_index.mask(limits)
+            
+            if search_query:
+                hits, fuzzy = search_positions(search_query, name_index, fuzzy_index)
+                if fuzzy and len(hits) > 0:
+                    st.caption(f"No strain name contains \"{search_query}\" - showing closest matches")
+                # A name search leaves few rows: sort just those by rank, O(k log k) in the hits
+                hits = np.unique(hits)
+                positions = sort_index.arrange(BROWSE_SORTS[sort_by], hits[facet_mask[hits]])
+            else:
+                # Filtered view = cached sort permutation masked by the filters (no catalog copy or re-sort)
+                positions = sort_index.view(BROWSE_SORTS[sort_by], facet_mask)
         
-        st.markdown(f"*Showing {len(filtered_df)} strains*")
+        st.markdown(f"*Showing {len(positions)} strains*")
         
         # Display strains
-        for idx, strain in filtered_df.head(20).iterrows():
+        for idx, strain in df.iloc[positions[:20]].iterrows():
             with st.container():
                 # Main info row
                 col1, col2, col3, col4 = st.columns([3, 1, 1, 1])
@@ -1377,7 +1561,7 @@ def main():
                 # Show details if button was clicked
                 if st.session_state.get(f'show_details_{idx}', False):
                     strain['match_score'] = 0
-                    render_strain_card(strain, 0)
+                    render_strain_card(strain, 0, tag_index, quantiles)
 
                 # Add spacing between strain items
                 st.markdown("<div style='margin-bottom: 1rem;'></div>", unsafe_allow_html=True)
@@ -1456,6 +1640,12 @@ def main():
         <p>Data sources: 43,000+ lab tests from state-certified facilities</p>
     </div>
     """, unsafe_allow_html=True)
+    
+    if 'memory_saved_bytes' in df.attrs:
+        st.caption(
+            f"Catalog in memory: {df.attrs['memory_bytes'] / 1024:,.0f} KB "
+            f"({df.attrs['memory_saved_bytes'] / 1024:,.0f} KB saved by compact dtypes)"
+        )
 
 if __name__ == "__main__":
     main()
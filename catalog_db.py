@@ -0,0 +1,334 @@
+"""
+SQLite Catalog Backend
+======================
+Optional storage for the app catalog in one local SQLite file:
+
+    strains      one row per strain (catalog columns, derived columns included),
+                 position = app row order; indexed on name, type and key analytes
+    strain_tags  (position, field, tag) per effect / medical-use label, indexed by tag
+    strain_names FTS5 trigram index of the lower-cased names (rowid = position)
+    batches      per-batch COAs: analyte readings, lab, test date, sample weight
+    provenance   where each strain's values came from (catalog build, COA batch)
+
+Every catalog strain starts with one 'catalog' batch holding its values
+weighted by sample_count. add_batches() stores COA batches and recomputes
+only the affected strains as the sample-weighted mean of their batches - one
+batch update, no CSV regeneration. Rebuilding from a new catalog CSV keeps
+the COA batches and applies them again.
+
+select_positions() evaluates name search, tag facets, analyte ranges and
+sort order in SQL and returns app row positions.
+
+Usage:
+    python catalog_db.py [catalog.csv] [catalog.sqlite]      # (re)build from the catalog CSV
+    python catalog_db.py --batches coa.csv [catalog.sqlite]  # add / replace COA batches
+"""
+
+import sqlite3
+import sys
+from contextlib import closing
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from catalog_store import DEFAULT_CATALOG, add_derived_columns, file_digest, load_catalog
+from strain_engine import ANALYTE_COLUMNS, TERPENE_COLUMNS
+from strain_index import TAG_FIELDS, RangePredicate, TagTerm, split_tags
+
+DEFAULT_DB = 'strain_catalog.sqlite'
+
+# Analytes with a B-tree index (the Lab Value Limits filters)
+INDEXED_ANALYTES = ['thc_percent', 'cbd_percent'] + TERPENE_COLUMNS
+
+# Analytes a COA batch can report (total_terpenes is derived)
+BATCH_ANALYTES = [col for col in ANALYTE_COLUMNS if col != 'total_terpenes']
+
+SQL_OPERATORS = {'>=', '>', '<=', '<', '=='}
+
+# Shortest name query the trigram index can answer; shorter ones scan the names
+TRIGRAM_LENGTH = 3
+
+PathLike = Union[str, Path]
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _sql_type(dtype) -> str:
+    if pd.api.types.is_integer_dtype(dtype):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'REAL'
+    return 'TEXT'
+
+
+def _records(df: pd.DataFrame) -> List[tuple]:
+    """Rows as plain Python values, NaN as NULL"""
+    values = df.astype(object).where(df.notna(), None)
+    return [tuple(v.item() if isinstance(v, np.generic) else v for v in row) for row in values.itertuples(index=False)]
+
+
+def connect(db_path: PathLike, read_only: bool = False) -> sqlite3.Connection:
+    if read_only:
+        return sqlite3.connect(f"file:{Path(db_path).resolve().as_posix()}?mode=ro", uri=True)
+    return sqlite3.connect(str(db_path))
+
+
+def _has_table(conn: sqlite3.Connection, name: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone() is not None
+
+
+def strain_columns(conn: sqlite3.Connection) -> List[str]:
+    """Catalog columns of the strains table, in catalog order"""
+    return [row[1] for row in conn.execute("PRAGMA table_info(strains)") if row[1] not in ('position', 'name_key')]
+
+
+# ============================================================================
+# WRITES
+# ============================================================================
+
+def _create_strains(conn: sqlite3.Connection, df: pd.DataFrame) -> None:
+    columns = ', '.join(f"{_quote(col)} {_sql_type(df[col].dtype)}" for col in df.columns)
+    conn.execute("DROP TABLE IF EXISTS strains")
+    conn.execute(f"CREATE TABLE strains (position INTEGER PRIMARY KEY, name_key TEXT NOT NULL, {columns})")
+    conn.execute("CREATE INDEX idx_strains_name ON strains(name_key)")
+    conn.execute("CREATE INDEX idx_strains_type ON strains(strain_type)")
+    for col in INDEXED_ANALYTES:
+        if col in df.columns:
+            conn.execute(f"CREATE INDEX {_quote('idx_strains_' + col)} ON strains({_quote(col)})")
+
+    conn.execute("DROP TABLE IF EXISTS strain_tags")
+    conn.execute("CREATE TABLE strain_tags (position INTEGER NOT NULL, field TEXT NOT NULL, tag TEXT NOT NULL)")
+    conn.execute("CREATE INDEX idx_strain_tags ON strain_tags(field, tag, position)")
+
+    conn.execute("DROP TABLE IF EXISTS strain_names")
+    try:
+        conn.execute("CREATE VIRTUAL TABLE strain_names USING fts5(name_key, tokenize='trigram')")
+    except sqlite3.OperationalError:
+        pass  # SQLite without FTS5 / trigram (< 3.34): name search scans name_key
+
+    batch_columns = ', '.join(f"{_quote(col)} REAL" for col in BATCH_ANALYTES)
+    conn.execute(f"""CREATE TABLE IF NOT EXISTS batches (
+        batch_id TEXT PRIMARY KEY, strain_name TEXT NOT NULL, source TEXT NOT NULL,
+        lab TEXT, test_date TEXT, samples INTEGER NOT NULL, {batch_columns})""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_batches_strain ON batches(strain_name)")
+    conn.execute("""CREATE TABLE IF NOT EXISTS provenance (
+        strain_name TEXT NOT NULL, source TEXT NOT NULL, detail TEXT, recorded_at TEXT NOT NULL)""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_provenance_strain ON provenance(strain_name)")
+
+
+def _insert_strains(conn: sqlite3.Connection, df: pd.DataFrame, positions: Sequence[int]) -> None:
+    """Insert catalog rows (with their tag rows) at the given positions"""
+    columns = ['position', 'name_key'] + list(df.columns)
+    rows = df.assign(position=list(positions), name_key=df['strain_name'].astype(str).str.lower())[columns]
+    placeholders = ', '.join('?' * len(columns))
+    conn.executemany(f"INSERT INTO strains ({', '.join(map(_quote, columns))}) VALUES ({placeholders})",
+                     _records(rows))
+    if _has_table(conn, 'strain_names'):
+        conn.executemany("INSERT INTO strain_names (rowid, name_key) VALUES (?, ?)",
+                         zip(map(int, rows['position']), rows['name_key']))
+
+    tags = [(position, field, tag)
+            for field, column in TAG_FIELDS.items() if field != 'type' and column in df.columns
+            for position, label in zip(positions, df[column]) for tag in split_tags(label)]
+    conn.executemany("INSERT INTO strain_tags (position, field, tag) VALUES (?, ?, ?)", tags)
+
+
+def _record(conn: sqlite3.Connection, rows: Sequence[Tuple[str, str, str]]) -> None:
+    """Append (strain_name, source, detail) provenance entries"""
+    now = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    conn.executemany("INSERT INTO provenance (strain_name, source, detail, recorded_at) VALUES (?, ?, ?, ?)",
+                     [(name, source, detail, now) for name, source, detail in rows])
+
+
+def _batch_means(conn: sqlite3.Connection, strain_name: str) -> Tuple[Dict[str, float], int]:
+    """Sample-weighted mean of every analyte over a strain's batches, and the total sample weight"""
+    # A single reading is kept as is rather than round-tripped through value * weight / weight
+    means = ', '.join(
+        f"CASE WHEN COUNT({col}) = 1 THEN MAX({col}) "
+        f"ELSE SUM({col} * samples) / SUM(CASE WHEN {col} IS NOT NULL THEN samples END) END"
+        for col in map(_quote, BATCH_ANALYTES)
+    )
+    row = conn.execute(f"SELECT SUM(samples), {means} FROM batches WHERE strain_name = ?", (strain_name,)).fetchone()
+    return dict(zip(BATCH_ANALYTES, row[1:])), int(row[0] or 0)
+
+
+def _refresh_strain(conn: sqlite3.Connection, strain_name: str) -> None:
+    """Recompute one strain's row from its batches (a new strain is appended and classified)"""
+    columns = strain_columns(conn)
+    means, samples = _batch_means(conn, strain_name)
+    found = conn.execute(f"SELECT position, {', '.join(map(_quote, columns))} FROM strains WHERE strain_name = ?",
+                         (strain_name,)).fetchone()
+    if found is None:
+        position = conn.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM strains").fetchone()[0]
+        row = pd.DataFrame([{col: np.nan for col in columns}]).astype(object)
+        row['strain_name'] = strain_name
+    else:
+        position = found[0]
+        row = pd.DataFrame([found[1:]], columns=columns)
+
+    for col, value in means.items():
+        if col in row.columns and value is not None:
+            row[col] = float(value)
+    if 'sample_count' in row.columns:
+        row['sample_count'] = samples
+
+    # total_terpenes / dominant_terpene follow the new values; missing labels are classified
+    analytes = [col for col in ANALYTE_COLUMNS if col in row.columns]
+    row[analytes] = row[analytes].astype(np.float64)
+    row = add_derived_columns(row)[columns]
+
+    if found is None:
+        _insert_strains(conn, row, [position])
+    else:
+        assignments = ', '.join(f"{_quote(col)} = ?" for col in columns)
+        conn.execute(f"UPDATE strains SET {assignments} WHERE position = ?", _records(row)[0] + (position,))
+
+
+def build_catalog_db(csv_path: PathLike = DEFAULT_CATALOG, db_path: PathLike = DEFAULT_DB) -> Path:
+    """(Re)build the strains, tags and catalog batches from a catalog CSV, then re-apply COA batches"""
+    df = load_catalog(csv_path)
+    detail = f"{Path(csv_path).name} sha1:{file_digest(csv_path)[:12]}"
+    weights = df['sample_count'].fillna(1).clip(lower=1).astype(int) if 'sample_count' in df.columns else 1
+    catalog_batches = pd.DataFrame({
+        'batch_id': 'catalog:' + df['strain_name'].astype(str),
+        'strain_name': df['strain_name'],
+        'source': 'catalog',
+        'lab': None,
+        'test_date': None,
+        'samples': weights,
+    })
+    for col in BATCH_ANALYTES:
+        catalog_batches[col] = df[col] if col in df.columns else np.nan
+
+    with closing(connect(db_path)) as conn, conn:
+        _create_strains(conn, df)
+        _insert_strains(conn, df, range(len(df)))
+        conn.execute("DELETE FROM batches WHERE source = 'catalog'")
+        conn.execute("DELETE FROM provenance WHERE source = 'catalog'")
+        conn.executemany(
+            f"INSERT OR REPLACE INTO batches ({', '.join(map(_quote, catalog_batches.columns))}) "
+            f"VALUES ({', '.join('?' * len(catalog_batches.columns))})",
+            _records(catalog_batches),
+        )
+        _record(conn, [(name, 'catalog', detail) for name in df['strain_name']])
+
+        for (strain_name,) in conn.execute("SELECT DISTINCT strain_name FROM batches WHERE source = 'coa'").fetchall():
+            _refresh_strain(conn, strain_name)
+    return Path(db_path)
+
+
+def add_batches(db_path: PathLike, batches: pd.DataFrame) -> int:
+    """Add or replace COA batches and recompute only the strains they belong to; returns strains updated
+
+    batches has batch_id, strain_name, optional lab / test_date / samples
+    (default 1) and any of the BATCH_ANALYTES columns.
+    """
+    missing = {'batch_id', 'strain_name'} - set(batches.columns)
+    if missing:
+        raise ValueError(f"COA batches need columns: {', '.join(sorted(missing))}")
+    unknown = set(batches.columns) - {'batch_id', 'strain_name', 'lab', 'test_date', 'samples'} - set(BATCH_ANALYTES)
+    if unknown:
+        raise ValueError(f"Unknown COA columns: {', '.join(sorted(unknown))}")
+
+    rows = batches.assign(source='coa')
+    rows['samples'] = rows['samples'].fillna(1).astype(int) if 'samples' in rows.columns else 1
+    with closing(connect(db_path)) as conn, conn:
+        conn.executemany(
+            f"INSERT OR REPLACE INTO batches ({', '.join(map(_quote, rows.columns))}) "
+            f"VALUES ({', '.join('?' * len(rows.columns))})",
+            _records(rows),
+        )
+        _record(conn, [(name, 'coa', f"batch {batch_id}" + (f" ({lab})" if isinstance(lab, str) else ''))
+                       for name, batch_id, lab in zip(rows['strain_name'], rows['batch_id'],
+                                                      rows['lab'] if 'lab' in rows.columns else [None] * len(rows))])
+        strain_names = list(dict.fromkeys(rows['strain_name']))
+        for strain_name in strain_names:
+            _refresh_strain(conn, strain_name)
+    return len(strain_names)
+
+
+# ============================================================================
+# READS
+# ============================================================================
+
+def read_catalog(db_path: PathLike) -> pd.DataFrame:
+    """The full catalog in app row order (same columns as catalog_store.load_catalog)"""
+    with closing(connect(db_path, read_only=True)) as conn:
+        columns = ', '.join(map(_quote, strain_columns(conn)))
+        return pd.read_sql_query(f"SELECT {columns} FROM strains ORDER BY position", conn)
+
+
+def select_positions(db_path: PathLike, name: Optional[str] = None, all_of: Sequence[TagTerm] = (),
+                     none_of: Sequence[TagTerm] = (), ranges: Sequence[RangePredicate] = (),
+                     order_by: Optional[Tuple[str, bool]] = None,
+                     within: Optional[Sequence[int]] = None) -> np.ndarray:
+    """App row positions matching every filter, in order_by (column, ascending) order or row order
+
+    name is a case-insensitive substring; tag terms are (field, tag) as in
+    TagIndex ('type' terms use the strain_type column); ranges are
+    (column, op, threshold) predicates; within restricts to given positions.
+    Missing values sort last. Names of TRIGRAM_LENGTH or more characters are
+    looked up in the strain_names trigram index; shorter ones scan name_key.
+    """
+    where, params = [], []
+    for negate, terms in ((False, all_of), (True, none_of)):
+        for field, tag in terms:
+            if field == 'type':
+                where.append("(strain_type IS NULL OR strain_type != ?)" if negate else "strain_type = ?")
+            else:
+                where.append(("NOT " if negate else "") + "EXISTS (SELECT 1 FROM strain_tags t WHERE "
+                             "t.field = ? AND t.tag = ? AND t.position = strains.position)")
+                params.append(field)
+            params.append(tag)
+
+    with closing(connect(db_path, read_only=True)) as conn:
+        if name:
+            name_where, name_params = ["instr(name_key, ?) > 0"], [name.lower()]
+            if len(name) >= TRIGRAM_LENGTH and _has_table(conn, 'strain_names'):
+                # The index folds case, so its hits are confirmed against the exact lower-cased key
+                name_where.insert(0, "position IN (SELECT rowid FROM strain_names WHERE strain_names MATCH ?)")
+                name_params.insert(0, '"' + name.lower().replace('"', '""') + '"')
+            where, params = name_where + where, name_params + params
+        columns = set(strain_columns(conn))
+        for col, op, threshold in ranges:
+            if col not in columns:
+                raise ValueError(f"Unknown analyte column: {col}")
+            if op not in SQL_OPERATORS:
+                raise ValueError(f"Unsupported range operator: {op}")
+            where.append(f"{_quote(col)} {'=' if op == '==' else op} ?")
+            params.append(float(threshold))
+        if within is not None:
+            within = [int(pos) for pos in within]
+            where.append(f"position IN ({', '.join('?' * len(within))})")
+            params.extend(within)
+
+        sql = "SELECT position FROM strains"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        if order_by is not None:
+            col, ascending = order_by
+            if col not in columns:
+                raise ValueError(f"Unknown sort column: {col}")
+            sql += f" ORDER BY {_quote(col)} IS NULL, {_quote(col)} {'ASC' if ascending else 'DESC'}, position"
+        else:
+            sql += " ORDER BY position"
+        return np.array([row[0] for row in conn.execute(sql, params)], dtype=np.int32)
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != '--batches']
+    if '--batches' in sys.argv:
+        if not args:
+            sys.exit("Usage: python catalog_db.py --batches coa.csv [catalog.sqlite]")
+        db = args[1] if len(args) > 1 else DEFAULT_DB
+        updated = add_batches(db, pd.read_csv(args[0]))
+        print(f"[+] {updated} strain(s) updated in {db}")
+    else:
+        csv_path = args[0] if args else DEFAULT_CATALOG
+        db = args[1] if len(args) > 1 else DEFAULT_DB
+        print(f"[+] Catalog database saved: {build_catalog_db(csv_path, db)}")
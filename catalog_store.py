@@ -0,0 +1,240 @@
+"""
+Strain Catalog Storage
+======================
+Typed columnar snapshot (.npz) of the app catalog, written next to the CSV by
+the ETL scripts. The snapshot already holds the derived columns, so a cold
+start skips CSV parsing, type inference and the total/dominant terpene work.
+
+The snapshot records the SHA-1 of the CSV it was built from and is ignored
+(falling back to the CSV) as soon as the CSV content changes.
+
+Lab quantile tables (median and p10/p90 per strain and analyte, one
+quantile_column() per level) use the same snapshot format.
+
+The numeric analyte matrix is also kept as a raw .npy file under
+MATRIX_CACHE_DIR, named after the catalog path and content, and opened
+memory-mapped read-only - every app process on the host shares the same
+physical pages.
+
+Usage:
+    python catalog_store.py [catalog.csv]    # rebuild the snapshot
+"""
+
+import hashlib
+import os
+import sys
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from strain_engine import (ANALYTE_COLUMNS, ANALYTE_INDEX, MATRIX_DTYPE, TERPENE_COLUMNS, build_strain_matrix,
+                           classify_strains)
+
+DEFAULT_CATALOG = 'strain_database_enhanced_v2.csv'
+SNAPSHOT_VERSION = 1
+MATRIX_CACHE_DIR = '.catalog_cache'
+
+# Quantile levels of the lab quantile table
+QUANTILE_LEVELS = (0.1, 0.5, 0.9)
+
+# Repeated labels stored dictionary-encoded by apply_catalog_schema()
+CATEGORY_COLUMNS = ['strain_type', 'data_quality', 'data_source', 'primary_effects', 'medical_uses', 'dominant_terpene']
+
+PathLike = Union[str, Path]
+
+
+def quantile_column(column: str, level: float) -> str:
+    """Quantile table column of one catalog column and level, e.g. thc_percent_p50"""
+    return f"{column}_p{round(level * 100):02d}"
+
+
+def add_derived_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Add total_terpenes and dominant_terpene to a freshly parsed catalog
+
+    Rows without a strain_type / primary_effects / medical_uses label (e.g. newly
+    appended batch COAs) are classified with the strain_engine rule tables.
+    """
+    available_terps = [col for col in TERPENE_COLUMNS if col in df.columns]
+    df['total_terpenes'] = df[available_terps].sum(axis=1)
+    df['dominant_terpene'] = df[available_terps].idxmax(axis=1)
+
+    labels = classify_strains(df)
+    for col in labels.columns:
+        df[col] = df[col].fillna(labels[col]) if col in df.columns else labels[col]
+    return df
+
+
+def apply_catalog_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Compact load-time dtypes: categorical labels and float32 analytes
+
+    The bytes saved are recorded in df.attrs['memory_saved_bytes'].
+    """
+    before = int(df.memory_usage(deep=True).sum())
+
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+
+    analytes = [col for col in ANALYTE_COLUMNS if col in df.columns]
+    df[analytes] = df[analytes].astype(MATRIX_DTYPE)
+
+    df.attrs['memory_bytes'] = int(df.memory_usage(deep=True).sum())
+    df.attrs['memory_saved_bytes'] = before - df.attrs['memory_bytes']
+    return df
+
+
+def exact_analytes(rows: pd.DataFrame, exact: np.ndarray, positions: np.ndarray) -> pd.DataFrame:
+    """Copy of a few catalog rows with the analyte columns read from the float64 matrix (values as stored)
+
+    positions are the rows' positions in the catalog the matrix was built from.
+    """
+    rows = rows.copy()
+    for col in ANALYTE_COLUMNS:
+        if col in rows.columns:
+            rows[col] = exact[positions, ANALYTE_INDEX[col]]
+    return rows
+
+
+def snapshot_path(csv_path: PathLike) -> Path:
+    """Snapshot file that belongs to a catalog CSV"""
+    return Path(csv_path).with_suffix('.npz')
+
+
+def file_digest(path: PathLike) -> str:
+    """SHA-1 of a file's content"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_snapshot(df: pd.DataFrame, path: PathLike, source_digest: str = '') -> Path:
+    """Write a DataFrame as one typed array per column"""
+    arrays = {
+        '__columns__': np.array(df.columns, dtype=str),
+        '__meta__': np.array([str(SNAPSHOT_VERSION), source_digest], dtype=str),
+    }
+    for i, col in enumerate(df.columns):
+        values = df[col]
+        if values.dtype == object:
+            # Strings are stored as fixed-width unicode plus a null mask (no pickling)
+            arrays[f'null_{i}'] = values.isna().to_numpy()
+            arrays[f'col_{i}'] = values.fillna('').astype(str).to_numpy(dtype=str)
+        else:
+            arrays[f'col_{i}'] = values.to_numpy()
+
+    path = Path(path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_snapshot(path: PathLike, source_digest: Optional[str] = None) -> Optional[pd.DataFrame]:
+    """Read a snapshot; None if missing, from another version, or built from different CSV content"""
+    path = Path(path)
+    if not path.exists():
+        return None
+
+    with np.load(path, allow_pickle=False) as data:
+        version, digest = data['__meta__']
+        if int(version) != SNAPSHOT_VERSION:
+            return None
+        if source_digest is not None and digest != source_digest:
+            return None
+
+        columns = {}
+        for i, col in enumerate(data['__columns__']):
+            values = data[f'col_{i}']
+            if f'null_{i}' in data.files:
+                values = values.astype(object)
+                values[data[f'null_{i}']] = np.nan
+            columns[str(col)] = values
+
+    return pd.DataFrame(columns)
+
+
+def build_snapshot(csv_path: PathLike) -> Path:
+    """Parse a catalog CSV, add the derived columns and write its snapshot"""
+    df = add_derived_columns(pd.read_csv(csv_path))
+    return write_snapshot(df, snapshot_path(csv_path), file_digest(csv_path))
+
+
+def load_catalog(csv_path: PathLike) -> pd.DataFrame:
+    """Load the catalog from its snapshot when it is current, otherwise from the CSV"""
+    csv_exists = os.path.exists(csv_path)
+    df = read_snapshot(snapshot_path(csv_path), file_digest(csv_path) if csv_exists else None)
+    if df is not None:
+        return df
+    return add_derived_columns(pd.read_csv(csv_path))
+
+
+def matrix_prefix(csv_path: PathLike, dtype=MATRIX_DTYPE) -> str:
+    """File name prefix of the shared matrices of one dtype built from one catalog file"""
+    source = hashlib.sha1(str(Path(csv_path).resolve()).encode()).hexdigest()[:12]
+    return f"strain_matrix_{source}_{np.dtype(dtype).name}_"
+
+
+def matrix_path(csv_path: PathLike, source_digest: str, cache_dir: PathLike = MATRIX_CACHE_DIR,
+                dtype=MATRIX_DTYPE) -> Path:
+    """Shared matrix file for one catalog file, its version and the analyte column layout"""
+    layout = f"{np.dtype(dtype).name}:{','.join(ANALYTE_COLUMNS)}"
+    key = hashlib.sha1(f"{source_digest}|{layout}".encode()).hexdigest()[:16]
+    return Path(cache_dir) / f"{matrix_prefix(csv_path, dtype)}{key}.npy"
+
+
+def open_strain_matrix(csv_path: PathLike, df: pd.DataFrame, cache_dir: PathLike = MATRIX_CACHE_DIR,
+                       dtype=MATRIX_DTYPE) -> np.ndarray:
+    """Read-only memory-mapped analyte matrix for the catalog, written on first use
+
+    dtype=np.float64 keeps the values exactly as stored, if df still holds them
+    at float64 (i.e. before apply_catalog_schema()).
+    """
+    path = matrix_path(csv_path, file_digest(csv_path), cache_dir, dtype)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write under a per-process name and rename, so concurrent workers never see a partial file
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            np.save(f, build_strain_matrix(df, dtype=dtype))
+        os.replace(tmp_path, path)
+
+        # Drop matrices of older versions of this catalog file only - other catalogs or
+        # backends share the directory (still-mapped files stay valid until unmapped)
+        for stale in path.parent.glob(f'{matrix_prefix(csv_path, dtype)}*.npy'):
+            if stale != path:
+                try:
+                    stale.unlink()
+                except OSError:
+                    pass
+
+    return np.load(path, mmap_mode='r')
+
+
+def share_analyte_columns(df: pd.DataFrame, matrix: np.ndarray) -> pd.DataFrame:
+    """The catalog with its analyte columns replaced by read-only views of the strain matrix
+
+    With a memory-mapped matrix the analyte values then exist once per host,
+    not once per process; only the label and text columns stay private.
+    df.attrs['memory_bytes'] counts the private part.
+    """
+    columns = {
+        col: matrix[:, ANALYTE_INDEX[col]] if col in ANALYTE_INDEX and df[col].dtype == matrix.dtype else df[col]
+        for col in df.columns
+    }
+    # copy=False keeps one block per column, each a view - no consolidation into a private copy
+    shared = pd.DataFrame(columns, index=df.index, copy=False)
+    shared.attrs.update(df.attrs)
+    if 'memory_bytes' in df.attrs:
+        views = [col for col in df.columns if np.shares_memory(shared[col].to_numpy(), matrix)]
+        shared.attrs['memory_bytes'] -= int(sum(shared[col].nbytes for col in views))
+    return shared
+
+
+if __name__ == "__main__":
+    catalog = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CATALOG
+    print(f"[+] Snapshot written: {build_snapshot(catalog)}")
@@ -1,21 +1,48 @@
 """
 Extract and aggregate real lab data from Terpene Profile Parser repository
 Creates enhanced strain database with statistical validation
+
+Per-strain statistics are kept in LAB_STATE between runs, so a run only reads
+the rows appended to the export since the last one. Pass --full to rebuild
+the statistics from the whole export, --parallel to aggregate across all CPU
+cores (same output).
+
+With --store the export is first appended to the Parquet store at LAB_STORE
+(see lab_store) and the statistics read from there - only the analyte columns
+used here; --since YEAR also skips the partitions of older test years.
+
+Spelling variants of sample names ("BLUE DREAM", "Blue Dream - Shake") are
+merged into one strain before filtering; the alias map is written to
+ALIASES_PATH.
+
+Next to the CSV, QUANTILES_PATH holds the sketched median and p10/p90 of each
+analyte for the same strains (catalog units, catalog_store snapshot format).
+
+Means come from exact sums. The original per-strain Series.mean() summed in
+float64, and its last-bit error decided which way a mean lying exactly on a
+rounding midpoint went; the few output cells on a midpoint are recomputed that
+way from their readings (one extra pass over those strains' samples), so the
+CSV matches the original script.
 """
 
+import os
+import sys
 import pandas as pd
 import numpy as np
 from pathlib import Path
 
-# Load the massive lab dataset
-print("Loading 43,000+ lab samples...")
-df = pd.read_csv(
-    r'C:\Projects\Terpene-Profile-Parser-for-Cannabis-Strains-master\Terpene-Profile-Parser-for-Cannabis-Strains-master\results.csv',
-    low_memory=False
-)
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from catalog_store import QUANTILE_LEVELS, quantile_column, write_snapshot
+from lab_aggregation import NAME_COLUMN, read_results, update_aggregate
+from lab_store import ingest_export, read_store, update_store_aggregate
+from strain_names import canonical_names, write_alias_map
 
-print(f"OK Loaded {len(df):,} samples from {df['Database Name'].nunique()} labs")
-print(f"OK {df['Sample Name'].nunique():,} unique strain names")
+RAW_RESULTS = r'C:\Projects\Terpene-Profile-Parser-for-Cannabis-Strains-master\Terpene-Profile-Parser-for-Cannabis-Strains-master\results.csv'
+LAB_STATE = r'C:\Projects\terpene_profiler_v1.3\lab_results_state.npz'
+LAB_STORE = r'C:\Projects\terpene_profiler_v1.3\lab_results'
+OUTPUT_PATH = r'C:\Projects\terpene_profiler_v1.3\strain_database_lab_verified.csv'
+QUANTILES_PATH = r'C:\Projects\terpene_profiler_v1.3\strain_database_lab_quantiles.npz'
+ALIASES_PATH = r'C:\Projects\terpene_profiler_v1.3\strain_aliases.csv'
 
 # Key terpene columns (standardized names)
 terpene_map = {
@@ -36,127 +63,260 @@ cannabinoid_map = {
     'CBN': 'cbn'
 }
 
-# Convert percentages to decimals and handle NaN
-for col in list(terpene_map.keys()) + list(cannabinoid_map.keys()):
-    if col in df.columns:
-        df[col] = pd.to_numeric(df[col], errors='coerce') / 100  # Convert to decimal
-
-print("\n" + "="*60)
-print("AGGREGATING BY STRAIN NAME")
-print("="*60)
-
-# Group by strain name and calculate statistics
-strain_data = []
-
-for strain_name, group in df.groupby('Sample Name'):
-    # Need at least 3 samples for statistical validity
-    if len(group) < 3:
-        continue
-    
-    # Skip if strain name is too generic or unclear
-    if len(strain_name) < 3 or strain_name.lower() in ['trim', 'shake', 'mix', 'blend']:
-        continue
-    
-    # Calculate means for terpenes
-    terp_means = {}
-    for orig_col, std_col in terpene_map.items():
-        if orig_col in group.columns:
-            values = group[orig_col].dropna()
-            if len(values) >= 2:  # Need at least 2 valid readings
-                terp_means[std_col] = values.mean()
-    
-    # Calculate means for cannabinoids
-    cann_means = {}
-    for orig_col, std_col in cannabinoid_map.items():
-        if orig_col in group.columns:
-            values = group[orig_col].dropna()
-            if len(values) >= 2:
-                cann_means[std_col] = values.mean()
-    
-    # Only include if we have good terpene data
-    if len(terp_means) >= 4:  # At least 4 terpenes measured
-        strain_info = {
-            'strain_name': strain_name,
-            'sample_count': len(group),
-            'lab_sources': ', '.join(group['Database Name'].unique()),
-            **terp_means,
-            **cann_means
-        }
-        strain_data.append(strain_info)
-
-# Create DataFrame
-result_df = pd.DataFrame(strain_data)
-
-print(f"\nOK Aggregated {len(result_df)} strains with sufficient data")
-print(f"  (from {len(result_df[result_df['sample_count'] >= 5])} with 5+ samples)")
-
-# Fill missing values with 0
-terpene_cols = list(terpene_map.values())
-cannabinoid_cols = list(cannabinoid_map.values())
-
-for col in terpene_cols + cannabinoid_cols:
-    if col in result_df.columns:
-        result_df[col] = result_df[col].fillna(0)
+analyte_map = {**terpene_map, **cannabinoid_map}
+
+# Output columns rounded from the strain means: (analytes summed, factor, decimals)
+output_rounding = {
+    'thc_percent': (['thc'], 100, 1),
+    'cbd_percent': (['cbd'], 100, 2),
+    'cbn_percent': (['cbn'], 100, 2),
+    'pinene': (['alpha_pinene', 'beta_pinene'], 1, 4),
+    **{name: ([name], 1, 4) for name in ['myrcene', 'limonene', 'caryophyllene', 'linalool', 'humulene',
+                                         'terpinolene', 'ocimene']},
+}
+
+# Distance from a rounding midpoint (in units of the last kept decimal) within
+# which a mean is recomputed the float64 way - far above the exact means' error
+MIDPOINT_TOLERANCE = 1e-6
+
+
+def canonicalize(aggregate):
+    """(statistics per canonical strain name, raw name -> canonical name map); the map also goes to ALIASES_PATH"""
+    print("\n" + "="*60)
+    print("CANONICALIZING STRAIN NAMES")
+    print("="*60)
+
+    samples = aggregate.sample_counts()
+    aliases = canonical_names(samples.index, samples.to_numpy())
+    canonical = aggregate.relabel(aliases)
+    write_alias_map(aliases, ALIASES_PATH)
+
+    print(f"OK Merged {len(aliases):,} spelling variants: {len(aggregate):,} names -> {len(canonical):,} strains")
+    print(f"  Alias map: {ALIASES_PATH}")
+    return canonical, aliases
+
+
+def lab_samples(aliases=None, store=False, since=None):
+    """Reader of the lab samples behind the statistics: analyte columns -> chunks with canonical names"""
+    def read(columns):
+        chunks = read_store(LAB_STORE, columns, since=since) if store else read_results(RAW_RESULTS, columns)
+        for chunk in chunks:
+            if aliases:
+                chunk[NAME_COLUMN] = chunk[NAME_COLUMN].map(aliases).fillna(chunk[NAME_COLUMN])
+            yield chunk
+    return read
+
+
+def midpoint_cells(strains):
+    """(strain name, analyte) pairs whose output rounding lies on a midpoint of the means"""
+    cells = set()
+    for analytes, factor, decimals in output_rounding.values():
+        if not all(name in strains.columns for name in analytes):
+            continue
+        scaled = sum(strains[name] for name in analytes) * factor * 10 ** decimals
+        on_midpoint = (scaled - np.floor(scaled) - 0.5).abs() < MIDPOINT_TOLERANCE
+        for strain in strains.loc[on_midpoint, 'strain_name']:
+            cells.update((strain, name) for name in analytes)
+    return cells
+
+
+def float_means(strains, samples):
+    """strains with the means on a rounding midpoint recomputed as the original Series.mean() of the readings"""
+    cells = midpoint_cells(strains)
+    if not cells:
+        return strains
+    columns = {name: col for col, name in analyte_map.items()}
+    wanted = sorted({name for _, name in cells})
+    names = {strain for strain, _ in cells}
+    readings = []
+    for chunk in samples([columns[name] for name in wanted]):
+        readings.append(chunk[chunk[NAME_COLUMN].isin(names)])
+    # Export row order (store chunks come in storage order), decimals as in the original
+    readings = pd.concat(readings).sort_index()
+
+    strains = strains.copy()
+    for strain, name in cells:
+        if columns[name] not in readings.columns:
+            continue
+        values = (readings.loc[readings[NAME_COLUMN] == strain, columns[name]] / 100).dropna()
+        if len(values) >= 2:  # Means of fewer readings were dropped (filled with 0)
+            strains.loc[strains['strain_name'] == strain, name] = values.mean()
+    print(f"OK Recomputed {len(cells)} means on a rounding midpoint from {len(readings):,} samples")
+    return strains
+
+
+def build_lab_verified(aggregate, samples=None):
+    """Lab-verified catalog (top 100 most-tested strains) from the per-strain lab statistics
+
+    samples (see lab_samples) reads the readings for means on a rounding midpoint;
+    without it every mean is rounded from the exact sums.
+    """
+    print("\n" + "="*60)
+    print("AGGREGATING BY STRAIN NAME")
+    print("="*60)
+
+    # Per-strain statistics for every analyte, combined from the chunk aggregates
+    sample_counts = aggregate.sample_counts()
+    valid_counts = aggregate.valid_counts()
+    means = aggregate.means() / 100  # Convert percentages to decimals
+    lab_sources = aggregate.lab_sources()
+
+    # Need at least 2 valid readings for a mean to count
+    means = means.where(valid_counts >= 2)
+
+    # Need at least 3 samples for statistical validity, a specific strain name,
+    # and at least 4 terpenes measured
+    names = sample_counts.index.to_series()
+    terp_cols = list(terpene_map)
+    keep = (
+        (sample_counts >= 3)
+        & (names.str.len() >= 3)
+        & ~names.str.lower().isin(['trim', 'shake', 'mix', 'blend'])
+        & ((valid_counts[terp_cols] >= 2).sum(axis=1) >= 4)
+    )
+
+    result_df = means[keep].rename(columns=analyte_map)
+    # Analytes no kept strain has a mean for stay absent (filled with 0 below)
+    result_df = result_df.dropna(axis=1, how='all')
+    result_df.insert(0, 'strain_name', result_df.index)
+    result_df.insert(1, 'sample_count', sample_counts[keep])
+    result_df.insert(2, 'lab_sources', lab_sources[keep])
+    result_df = result_df.reset_index(drop=True)
+
+    print(f"\nOK Aggregated {len(result_df)} strains with sufficient data")
+    print(f"  (from {len(result_df[result_df['sample_count'] >= 5])} with 5+ samples)")
+
+    # Fill missing values with 0
+    terpene_cols = list(terpene_map.values())
+    cannabinoid_cols = list(cannabinoid_map.values())
+
+    for col in terpene_cols + cannabinoid_cols:
+        if col in result_df.columns:
+            result_df[col] = result_df[col].fillna(0)
+        else:
+            result_df[col] = 0
+
+    # Sort by sample count (most tested strains first)
+    result_df = result_df.sort_values('sample_count', ascending=False)
+
+    # Save top 100 strains
+    top_strains = result_df.head(100)
+    if samples is not None:
+        top_strains = float_means(top_strains, samples)
+
+    print("\n" + "="*60)
+    print("TOP 10 MOST-TESTED STRAINS")
+    print("="*60)
+    for idx, row in top_strains.head(10).iterrows():
+        print(f"{row['strain_name']}: {row['sample_count']} samples from {row['lab_sources']}")
+
+    # Calculate combined pinene (alpha + beta)
+    if 'alpha_pinene' in top_strains.columns and 'beta_pinene' in top_strains.columns:
+        top_strains['pinene'] = top_strains['alpha_pinene'] + top_strains['beta_pinene']
     else:
-        result_df[col] = 0
-
-# Sort by sample count (most tested strains first)
-result_df = result_df.sort_values('sample_count', ascending=False)
-
-# Save top 100 strains
-top_strains = result_df.head(100)
-
-print("\n" + "="*60)
-print("TOP 10 MOST-TESTED STRAINS")
-print("="*60)
-for idx, row in top_strains.head(10).iterrows():
-    print(f"{row['strain_name']}: {row['sample_count']} samples from {row['lab_sources']}")
-
-# Calculate combined pinene (alpha + beta)
-if 'alpha_pinene' in top_strains.columns and 'beta_pinene' in top_strains.columns:
-    top_strains['pinene'] = top_strains['alpha_pinene'] + top_strains['beta_pinene']
-else:
-    top_strains['pinene'] = 0
-
-# Prepare final output format matching your app
-output_df = pd.DataFrame({
-    'strain_name': top_strains['strain_name'],
-    'thc_percent': (top_strains['thc'] * 100).round(1),
-    'cbd_percent': (top_strains['cbd'] * 100).round(2),
-    'cbn_percent': (top_strains['cbn'] * 100).round(2),
-    'myrcene': top_strains['myrcene'].round(4),
-    'limonene': top_strains['limonene'].round(4),
-    'caryophyllene': top_strains['caryophyllene'].round(4),
-    'linalool': top_strains['linalool'].round(4),
-    'pinene': top_strains['pinene'].round(4),
-    'humulene': top_strains['humulene'].round(4),
-    'terpinolene': top_strains['terpinolene'].round(4),
-    'ocimene': top_strains['ocimene'].round(4),
-    'sample_count': top_strains['sample_count'],
-    'data_source': 'Lab-Aggregated (' + top_strains['sample_count'].astype(str) + ' samples)',
-    'lab_sources': top_strains['lab_sources']
-})
-
-# Save to CSV
-output_path = r'C:\Projects\terpene_profiler_v1.3\strain_database_lab_verified.csv'
-output_df.to_csv(output_path, index=False)
-
-print(f"\nOK Saved {len(output_df)} lab-verified strains to:")
-print(f"  {output_path}")
-
-# Show sample data
-print("\n" + "="*60)
-print("SAMPLE OUTPUT (First 3 Strains)")
-print("="*60)
-print(output_df.head(3).to_string())
-
-print("\n" + "="*60)
-print("STATISTICS")
-print("="*60)
-print(f"Average samples per strain: {output_df['sample_count'].mean():.1f}")
-print(f"Median samples per strain: {output_df['sample_count'].median():.0f}")
-print(f"Max samples for one strain: {output_df['sample_count'].max()}")
-print(f"Strains with 10+ samples: {len(output_df[output_df['sample_count'] >= 10])}")
-print(f"Strains with 20+ samples: {len(output_df[output_df['sample_count'] >= 20])}")
-
-print("\nDONE - EXTRACTION COMPLETE!")
+        top_strains['pinene'] = 0
+
+    # Prepare final output format matching your app
+    output_df = pd.DataFrame({
+        'strain_name': top_strains['strain_name'],
+        'thc_percent': (top_strains['thc'] * 100).round(1),
+        'cbd_percent': (top_strains['cbd'] * 100).round(2),
+        'cbn_percent': (top_strains['cbn'] * 100).round(2),
+        'myrcene': top_strains['myrcene'].round(4),
+        'limonene': top_strains['limonene'].round(4),
+        'caryophyllene': top_strains['caryophyllene'].round(4),
+        'linalool': top_strains['linalool'].round(4),
+        'pinene': top_strains['pinene'].round(4),
+        'humulene': top_strains['humulene'].round(4),
+        'terpinolene': top_strains['terpinolene'].round(4),
+        'ocimene': top_strains['ocimene'].round(4),
+        'sample_count': top_strains['sample_count'],
+        'data_source': 'Lab-Aggregated (' + top_strains['sample_count'].astype(str) + ' samples)',
+        'lab_sources': top_strains['lab_sources']
+    })
+
+    return output_df
+
+
+def build_lab_quantiles(aggregate, output_df):
+    """Median and p10/p90 of every analyte for the strains in output_df, in catalog units"""
+    quantiles = aggregate.quantiles(QUANTILE_LEVELS)
+    names = output_df['strain_name'].to_numpy()
+    table = pd.DataFrame({'strain_name': names})
+    for raw_col, name in analyte_map.items():
+        # Cannabinoids are stored in percent, terpenes as fractions; catalog pinene
+        # is alpha + beta, and a sum has no per-analyte quantile, so it is left out
+        column, scale = (f'{name}_percent', 1) if name in cannabinoid_map.values() else (name, 0.01)
+        if column not in output_df.columns:
+            continue
+        for level in QUANTILE_LEVELS:
+            values = quantiles[level].loc[names, raw_col].to_numpy() * scale
+            table[quantile_column(column, level)] = values.astype(np.float32)
+    return table
+
+
+def write_lab_quantiles(aggregate, output_df):
+    """Write the quantile table of the lab-verified strains to QUANTILES_PATH"""
+    path = write_snapshot(build_lab_quantiles(aggregate, output_df), QUANTILES_PATH)
+    print(f"OK Saved median and p10/p90 bands to:")
+    print(f"  {path}")
+
+
+def report(output_df):
+    """Print sample rows and sample-count statistics of the lab-verified catalog"""
+    # Show sample data
+    print("\n" + "="*60)
+    print("SAMPLE OUTPUT (First 3 Strains)")
+    print("="*60)
+    print(output_df.head(3).to_string())
+
+    print("\n" + "="*60)
+    print("STATISTICS")
+    print("="*60)
+    print(f"Average samples per strain: {output_df['sample_count'].mean():.1f}")
+    print(f"Median samples per strain: {output_df['sample_count'].median():.0f}")
+    print(f"Max samples for one strain: {output_df['sample_count'].max()}")
+    print(f"Strains with 10+ samples: {len(output_df[output_df['sample_count'] >= 10])}")
+    print(f"Strains with 20+ samples: {len(output_df[output_df['sample_count'] >= 20])}")
+
+    print("\nDONE - EXTRACTION COMPLETE!")
+
+
+def stream_lab_statistics(full=False, workers=1, store=False, since=None):
+    """Per-strain lab statistics, updated with the samples added to the export since the last run"""
+    # Stream the new lab samples in bounded chunks (name, lab and analyte columns
+    # only) into the saved per-strain statistics
+    if store:
+        print(f"OK Appended {ingest_export(RAW_RESULTS, LAB_STORE):,} export rows to {LAB_STORE}")
+        print("Reading lab samples from the store...")
+        aggregate, new_rows = update_store_aggregate(LAB_STORE, list(analyte_map), LAB_STATE, full=full, since=since)
+    else:
+        print("Streaming lab samples...")
+        aggregate, new_rows = update_aggregate(RAW_RESULTS, list(analyte_map), LAB_STATE, full=full, workers=workers)
+
+    print(f"OK Folded in {new_rows:,} new samples")
+    print(f"OK Loaded {aggregate.rows:,} samples from {aggregate.lab_count()} labs")
+    print(f"OK {len(aggregate):,} unique strain names")
+    return aggregate
+
+
+def main():
+    workers = (os.cpu_count() or 1) if '--parallel' in sys.argv else 1
+    since = int(sys.argv[sys.argv.index('--since') + 1]) if '--since' in sys.argv else None
+    store = '--store' in sys.argv or since is not None
+    aggregate, aliases = canonicalize(stream_lab_statistics(full='--full' in sys.argv, workers=workers, store=store,
+                                                            since=since))
+    output_df = build_lab_verified(aggregate, lab_samples(aliases, store, since))
+
+    # Save to CSV
+    output_df.to_csv(OUTPUT_PATH, index=False)
+
+    print(f"\nOK Saved {len(output_df)} lab-verified strains to:")
+    print(f"  {OUTPUT_PATH}")
+    write_lab_quantiles(aggregate, output_df)
+
+    report(output_df)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,535 @@
+"""
+Streaming Lab Result Aggregation
+================================
+Reads the raw lab export (results.csv) in bounded chunks - only the columns an
+ETL step needs, with explicit dtypes - and folds each chunk into per-strain
+partial statistics. Peak memory depends on the chunk size and the number of
+distinct strains, not on the size of the export.
+
+Analyte sums are kept as int64 fixed-point (FIXED_POINT_SCALE units per
+percent), so combining partial aggregates is exact and independent of chunk
+boundaries or merge order.
+
+An aggregate can be saved with a watermark - the byte offset of the export it
+has consumed. update_aggregate() then folds in only the rows appended since,
+and starts over when the already-consumed part of the export has changed.
+
+With workers > 1 the export is split into byte ranges of whole lines that are
+aggregated in a process pool and merged in file order - the result is
+identical to a serial pass. (Assumes no line breaks inside quoted fields.)
+
+Each strain and analyte also gets a quantile sketch: reading counts in
+log-spaced buckets (SKETCH_ACCURACY relative width). Counts merge exactly, so
+median / p10 / p90 come out the same however the export was partitioned.
+"""
+
+import hashlib
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+NAME_COLUMN = 'Sample Name'
+LAB_COLUMN = 'Database Name'
+CHUNK_ROWS = 50_000
+
+# Fixed-point resolution of analyte sums (1e-9 percent - far below lab precision)
+FIXED_POINT_SCALE = 10 ** 9
+
+# Fixed-point resolution of squared readings (1e-4 percent, the export's precision;
+# keeps sums of squares of readings up to 100% in int64 for millions of samples)
+SQUARE_SCALE = 10 ** 4
+
+# Quantile sketch buckets: a reading maps to ceil(log_gamma(value)), so every
+# bucket spans values within SKETCH_ACCURACY (relative) of its representative
+SKETCH_ACCURACY = 0.01
+SKETCH_GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+SKETCH_BUCKETS = 2048
+SKETCH_OFFSET = SKETCH_BUCKETS // 2  # bucket code of readings in (1/gamma, 1]; code 0 holds readings <= 0
+
+# Buffered sketch entries folded together once they outgrow the compacted ones
+SKETCH_COMPACT_ENTRIES = 1 << 20
+
+STATE_VERSION = 2
+
+# Read size while hashing the consumed part of the export
+HASH_BLOCK = 1 << 20
+
+# first_row entry of a (strain, lab) pair not seen yet
+NOT_SEEN = np.iinfo(np.int64).max
+
+PathLike = Union[str, Path]
+
+
+def available_columns(path: PathLike, columns: Sequence[str]) -> List[str]:
+    """The requested columns that exist in the export header, in request order"""
+    header = set(pd.read_csv(path, nrows=0).columns)
+    return [col for col in columns if col in header]
+
+
+class _ByteRange(io.RawIOBase):
+    """Read-only view of a binary file that ends at a given byte offset"""
+
+    def __init__(self, f, end: int):
+        self.f = f
+        self.end = end
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.f.read(max(0, min(len(buffer), self.end - self.f.tell())))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def read_results(path: PathLike, analytes: Sequence[str], chunksize: int = CHUNK_ROWS,
+                 offset: int = 0, first_row: int = 0, end: Optional[int] = None,
+                 text_columns: Sequence[str] = ()) -> Iterator[pd.DataFrame]:
+    """Stream the export as chunks of name, lab, text_columns and analyte columns (analytes as float64 percent)
+
+    Analytes are read as text and coerced per chunk, so 'ND' / '<LOQ' style
+    entries become NaN exactly as pd.to_numeric(errors='coerce') did on the
+    whole file. The chunk index is the row number within the export.
+
+    A non-zero offset (a line start past the header) resumes reading there;
+    first_row is the export row number of that line. end (a line start) stops
+    reading before that byte.
+    """
+    analytes = available_columns(path, analytes)
+    usecols = [NAME_COLUMN, LAB_COLUMN] + list(text_columns) + analytes
+    dtypes = {col: str for col in usecols}
+    with open(path, 'rb') as f:
+        if offset:
+            header = list(pd.read_csv(path, nrows=0).columns)
+            f.seek(offset)
+            source = io.BufferedReader(_ByteRange(f, end)) if end is not None else f
+            reader = pd.read_csv(source, header=None, names=header, usecols=usecols, dtype=dtypes, chunksize=chunksize)
+        else:
+            reader = pd.read_csv(f, usecols=usecols, dtype=dtypes, chunksize=chunksize)
+        for chunk in reader:
+            for col in analytes:
+                chunk[col] = pd.to_numeric(chunk[col], errors='coerce')
+            chunk.index += first_row
+            yield chunk[usecols]
+
+
+def to_fixed_point(values: np.ndarray, scale: int = FIXED_POINT_SCALE) -> np.ndarray:
+    """Percent readings as int64 fixed-point units (NaN becomes 0)"""
+    return np.nan_to_num(np.rint(values * scale)).astype(np.int64)
+
+
+def sketch_buckets(values: np.ndarray) -> np.ndarray:
+    """Sketch bucket code per reading (0 for readings <= 0)"""
+    codes = np.zeros(values.shape, dtype=np.int64)
+    positive = values > 0
+    codes[positive] = np.clip(
+        np.ceil(np.log(values[positive]) / np.log(SKETCH_GAMMA)).astype(np.int64) + SKETCH_OFFSET,
+        1, SKETCH_BUCKETS - 1,
+    )
+    return codes
+
+
+def bucket_values(codes: np.ndarray) -> np.ndarray:
+    """Representative reading of each sketch bucket code (within SKETCH_ACCURACY of its members)"""
+    exponents = codes.astype(np.float64) - SKETCH_OFFSET
+    return np.where(codes > 0, 2 * SKETCH_GAMMA ** exponents / (SKETCH_GAMMA + 1), 0.0)
+
+
+def export_ranges(path: PathLike, parts: int, offset: int = 0) -> List[Tuple[int, int]]:
+    """Split the export from offset (default: after the header) into about equal byte ranges of whole lines"""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        if offset == 0:
+            f.readline()
+            offset = f.tell()
+        bounds = [offset]
+        for i in range(1, parts):
+            target = offset + (size - offset) * i // parts
+            if target <= bounds[-1]:
+                continue
+            # The line holding byte target-1 ends right before the next line start >= target
+            f.seek(target - 1)
+            f.readline()
+            if bounds[-1] < f.tell() < size:
+                bounds.append(f.tell())
+        bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+def map_ranges(worker: Callable[..., Any], path: PathLike, ranges: Sequence[Tuple[int, int]],
+               workers: int, *args) -> List[Any]:
+    """worker(path, start, end, *args) for every byte range in a process pool; results in range order"""
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(worker, path, start, end, *args) for start, end in ranges]
+        return [future.result() for future in futures]
+
+
+def export_checkpoint(path: PathLike, offset: int) -> str:
+    """SHA-1 of the export's first offset bytes - every consumed byte, so any change before offset shows
+
+    Costs one sequential read of the consumed part (hashing runs far faster than parsing it).
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        remaining = offset
+        while remaining > 0:
+            block = f.read(min(HASH_BLOCK, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest.hexdigest()
+
+
+class LabAggregate:
+    """Mergeable per-strain statistics: samples, valid readings, sums and sums of squares per analyte, labs seen
+
+    Strains get a dense id in first-seen order; counts and fixed-point sums
+    are int64 arrays indexed by that id, so folding in a chunk costs time
+    proportional to the chunk, not to the strains seen so far. first_row
+    holds, per strain and lab, the export row where the pair first appeared.
+    offset is the watermark: export bytes consumed (0 when not tracked).
+
+    The quantile sketch is a sparse count per (strain, analyte, bucket), kept
+    as sorted int64 keys plus counts and buffered between compactions.
+    """
+
+    def __init__(self, analytes: Sequence[str]):
+        self.analytes = list(analytes)
+        self.rows = 0
+        self.names: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self.samples = np.zeros(0, dtype=np.int64)
+        self.valid = np.zeros((0, len(self.analytes)), dtype=np.int64)
+        self.sums = np.zeros((0, len(self.analytes)), dtype=np.int64)
+        self.sumsq = np.zeros((0, len(self.analytes)), dtype=np.int64)
+        self.offset = 0
+        self.sketch_keys = np.zeros(0, dtype=np.int64)
+        self.sketch_counts = np.zeros(0, dtype=np.int64)
+        self._sketch_buffer: List[Tuple[np.ndarray, np.ndarray]] = []
+        self._buffered = 0
+        self.labs: List[str] = []
+        self._lab_ids: Dict[str, int] = {}
+        self.first_row = np.full((0, 0), NOT_SEEN, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _strain_ids(self, names: Sequence[str]) -> np.ndarray:
+        """Ids of the given strain names, registering unseen names"""
+        ids = np.empty(len(names), dtype=np.int64)
+        for i, name in enumerate(names):
+            strain_id = self._ids.get(name)
+            if strain_id is None:
+                strain_id = self._ids[name] = len(self.names)
+                self.names.append(name)
+            ids[i] = strain_id
+
+        # Grow the statistic arrays geometrically
+        if len(self.names) > len(self.samples):
+            capacity = max(len(self.names), 2 * len(self.samples), 1024)
+            extra = capacity - len(self.samples)
+            self.samples = np.concatenate([self.samples, np.zeros(extra, dtype=np.int64)])
+            self.valid = np.vstack([self.valid, np.zeros((extra, len(self.analytes)), dtype=np.int64)])
+            self.sums = np.vstack([self.sums, np.zeros((extra, len(self.analytes)), dtype=np.int64)])
+            self.sumsq = np.vstack([self.sumsq, np.zeros((extra, len(self.analytes)), dtype=np.int64)])
+            self.first_row = np.vstack([self.first_row, np.full((extra, self.first_row.shape[1]), NOT_SEEN)])
+        return ids
+
+    def _lab_ids_for(self, labs: Sequence[str]) -> np.ndarray:
+        """Ids of the given lab names, registering unseen labs"""
+        ids = np.empty(len(labs), dtype=np.int64)
+        for i, lab in enumerate(labs):
+            lab_id = self._lab_ids.get(lab)
+            if lab_id is None:
+                lab_id = self._lab_ids[lab] = len(self.labs)
+                self.labs.append(lab)
+            ids[i] = lab_id
+        if len(self.labs) > self.first_row.shape[1]:
+            extra = len(self.labs) - self.first_row.shape[1]
+            self.first_row = np.hstack([self.first_row, np.full((self.first_row.shape[0], extra), NOT_SEEN)])
+        return ids
+
+    def _see_labs(self, strain_ids: np.ndarray, lab_ids: np.ndarray, rows: np.ndarray) -> None:
+        """Record (strain, lab) sightings, keeping the earliest row (pairs must be unique)"""
+        self.first_row[strain_ids, lab_ids] = np.minimum(self.first_row[strain_ids, lab_ids], rows)
+
+    def _sketch_key(self, strain_ids: np.ndarray, analyte_ids: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        return (strain_ids * len(self.analytes) + analyte_ids) * SKETCH_BUCKETS + codes
+
+    def _add_sketch(self, keys: np.ndarray, counts: np.ndarray) -> None:
+        """Buffer sketch counts, compacting when the buffer outgrows the compacted sketch"""
+        self._sketch_buffer.append((keys, counts))
+        self._buffered += len(keys)
+        if self._buffered > max(SKETCH_COMPACT_ENTRIES, len(self.sketch_keys)):
+            self._compact_sketch()
+
+    def _compact_sketch(self) -> None:
+        """Fold buffered sketch counts into the sorted keys / counts arrays"""
+        if not self._sketch_buffer:
+            return
+        keys = np.concatenate([self.sketch_keys] + [keys for keys, _ in self._sketch_buffer])
+        counts = np.concatenate([self.sketch_counts] + [counts for _, counts in self._sketch_buffer])
+        self.sketch_keys, inverse = np.unique(keys, return_inverse=True)
+        self.sketch_counts = np.bincount(inverse.ravel(), weights=counts).astype(np.int64)
+        self._sketch_buffer = []
+        self._buffered = 0
+
+    def add_chunk(self, chunk: pd.DataFrame) -> 'LabAggregate':
+        """Fold one chunk of read_results() output into the statistics"""
+        self.rows += len(chunk)
+        named = chunk[chunk[NAME_COLUMN].notna()]
+        if len(named) == 0:
+            return self
+
+        codes, uniques = pd.factorize(named[NAME_COLUMN])
+        ids = self._strain_ids(uniques)
+
+        values = np.column_stack([
+            named[col].to_numpy(dtype=np.float64) if col in named.columns else np.full(len(named), np.nan)
+            for col in self.analytes
+        ]) if self.analytes else np.zeros((len(named), 0))
+
+        # Per-strain partials: counts by bincount, exact integer sums by sorted reduceat
+        order = np.argsort(codes, kind='stable')
+        starts = np.flatnonzero(np.r_[True, np.diff(codes[order]) != 0])
+        self.samples[ids] += np.bincount(codes, minlength=len(uniques))
+        self.valid[ids] += np.add.reduceat((~np.isnan(values)).astype(np.int64)[order], starts, axis=0)
+        self.sums[ids] += np.add.reduceat(to_fixed_point(values)[order], starts, axis=0)
+        self.sumsq[ids] += np.add.reduceat(to_fixed_point(values, SQUARE_SCALE)[order] ** 2, starts, axis=0)
+
+        readings, analyte_ids = np.nonzero(~np.isnan(values))
+        keys = self._sketch_key(ids[codes[readings]], analyte_ids, sketch_buckets(values[readings, analyte_ids]))
+        self._add_sketch(*np.unique(keys, return_counts=True))
+
+        labs = named[LAB_COLUMN]
+        lab_codes, lab_uniques = pd.factorize(labs)
+        pairs = pd.DataFrame({'strain': ids[codes], 'lab': lab_codes}, index=named.index)
+        pairs = pairs[pairs['lab'] >= 0].drop_duplicates()
+        lab_ids = self._lab_ids_for(lab_uniques)
+        self._see_labs(pairs['strain'].to_numpy(), lab_ids[pairs['lab'].to_numpy()], pairs.index.to_numpy(dtype=np.int64))
+        return self
+
+    def merge(self, other: 'LabAggregate', row_offset: int = 0) -> 'LabAggregate':
+        """Fold another aggregate into this one (exact, in any order)
+
+        row_offset shifts other's row numbers, for an aggregate of a later
+        part of the export that counted its rows from 0.
+        """
+        if other.analytes != self.analytes:
+            raise ValueError("Cannot merge aggregates over different analytes")
+        self.rows += other.rows
+        n = len(other)
+        ids = self._strain_ids(other.names)
+        self.samples[ids] += other.samples[:n]
+        self.valid[ids] += other.valid[:n]
+        self.sums[ids] += other.sums[:n]
+        self.sumsq[ids] += other.sumsq[:n]
+        lab_ids = self._lab_ids_for(other.labs)
+        strain_idx, lab_idx = np.nonzero(other.first_row[:n] != NOT_SEEN)
+        self._see_labs(ids[strain_idx], lab_ids[lab_idx], other.first_row[strain_idx, lab_idx] + row_offset)
+
+        other._compact_sketch()
+        groups, codes = np.divmod(other.sketch_keys, SKETCH_BUCKETS)
+        strain_ids, analyte_ids = np.divmod(groups, len(self.analytes))
+        self._add_sketch(self._sketch_key(ids[strain_ids], analyte_ids, codes), other.sketch_counts)
+        return self
+
+    def relabel(self, aliases: Dict[str, str]) -> 'LabAggregate':
+        """New aggregate with every strain's statistics folded into aliases.get(name, name) (exact)"""
+        self._compact_sketch()
+        relabeled = LabAggregate(self.analytes)
+        relabeled.rows = self.rows
+        relabeled.offset = self.offset
+        n = len(self)
+        ids = relabeled._strain_ids([aliases.get(name, name) for name in self.names])
+        np.add.at(relabeled.samples, ids, self.samples[:n])
+        np.add.at(relabeled.valid, ids, self.valid[:n])
+        np.add.at(relabeled.sums, ids, self.sums[:n])
+        np.add.at(relabeled.sumsq, ids, self.sumsq[:n])
+        relabeled._lab_ids_for(self.labs)
+        np.minimum.at(relabeled.first_row, ids, self.first_row[:n])
+
+        groups, codes = np.divmod(self.sketch_keys, SKETCH_BUCKETS)
+        strain_ids, analyte_ids = np.divmod(groups, len(self.analytes))
+        relabeled._add_sketch(relabeled._sketch_key(ids[strain_ids], analyte_ids, codes), self.sketch_counts)
+        return relabeled
+
+    def _sorted(self) -> Tuple[np.ndarray, pd.Index]:
+        """Strain ids in name order and the matching name index"""
+        names = np.array(self.names, dtype=object)
+        order = np.argsort(names, kind='stable')
+        return order, pd.Index(names[order], name=NAME_COLUMN)
+
+    def _frame(self, block: np.ndarray) -> pd.DataFrame:
+        """Per-strain analyte block as a DataFrame sorted by strain name"""
+        order, index = self._sorted()
+        return pd.DataFrame(block[order], index=index, columns=self.analytes)
+
+    def sample_counts(self) -> pd.Series:
+        """Rows per strain, sorted by strain name"""
+        order, index = self._sorted()
+        return pd.Series(self.samples[order], index=index, name='samples')
+
+    def valid_counts(self) -> pd.DataFrame:
+        """Non-missing readings per strain and analyte"""
+        return self._frame(self.valid)
+
+    def means(self) -> pd.DataFrame:
+        """Mean reading (percent) per strain and analyte; NaN without readings"""
+        counts = self.valid_counts()
+        sums = self._frame(self.sums)
+        return (sums / FIXED_POINT_SCALE / counts).where(counts > 0)
+
+    def stds(self) -> pd.DataFrame:
+        """Sample standard deviation (percent) per strain and analyte; NaN below 2 readings"""
+        counts = self.valid_counts()
+        means = self._frame(self.sums) / FIXED_POINT_SCALE / counts
+        squares = self._frame(self.sumsq) / SQUARE_SCALE ** 2
+        variance = ((squares - counts * means ** 2) / (counts - 1)).clip(lower=0)
+        return np.sqrt(variance).where(counts > 1)
+
+    def quantiles(self, levels: Sequence[float]) -> Dict[float, pd.DataFrame]:
+        """Sketched quantile (percent) per level, strain and analyte; NaN without readings
+
+        The value at rank floor(level * (n - 1)) of the sorted readings, to
+        within SKETCH_ACCURACY relative error.
+        """
+        self._compact_sketch()
+        groups = self.sketch_keys // SKETCH_BUCKETS
+        starts = np.flatnonzero(np.r_[True, np.diff(groups) != 0]) if len(groups) else np.zeros(0, dtype=np.int64)
+        totals = np.add.reduceat(self.sketch_counts, starts) if len(starts) else np.zeros(0, dtype=np.int64)
+        cumulative = np.cumsum(self.sketch_counts)
+        before = cumulative[starts] - self.sketch_counts[starts]
+        strain_ids, analyte_ids = np.divmod(groups[starts], len(self.analytes))
+
+        result = {}
+        for level in levels:
+            ranks = np.floor(level * (totals - 1)).astype(np.int64)
+            positions = np.searchsorted(cumulative, before + ranks, side='right')
+            block = np.full((len(self), len(self.analytes)), np.nan)
+            block[strain_ids, analyte_ids] = bucket_values(self.sketch_keys[positions] % SKETCH_BUCKETS)
+            result[level] = self._frame(block)
+        return result
+
+    def lab_count(self) -> int:
+        """Distinct labs seen"""
+        return len(self.labs)
+
+    def lab_sources(self) -> pd.Series:
+        """Comma-joined labs per strain in first-appearance order"""
+        order, index = self._sorted()
+        first_row = self.first_row[order]
+        lab_order = np.argsort(first_row, axis=1, kind='stable')
+        seen = np.take_along_axis(first_row, lab_order, axis=1) != NOT_SEEN
+        labs = np.array(self.labs, dtype=object)
+        joined = [', '.join(labs[lab_ids[mask]]) for lab_ids, mask in zip(lab_order, seen)]
+        return pd.Series(joined, index=index, name='lab_sources', dtype=object)
+
+    def save(self, path: PathLike, checkpoint: str = '') -> Path:
+        """Write the statistics and watermark (plus the export checkpoint) to an .npz file"""
+        self._compact_sketch()
+        n, n_labs = len(self), len(self.labs)
+        arrays = {
+            '__meta__': np.array([str(STATE_VERSION), str(self.rows), str(self.offset), checkpoint], dtype=str),
+            'analytes': np.array(self.analytes, dtype=str),
+            'names': np.array(self.names, dtype=str),
+            'labs': np.array(self.labs, dtype=str),
+            'samples': self.samples[:n],
+            'valid': self.valid[:n],
+            'sums': self.sums[:n],
+            'sumsq': self.sumsq[:n],
+            'first_row': self.first_row[:n, :n_labs],
+            'sketch_keys': self.sketch_keys,
+            'sketch_counts': self.sketch_counts,
+        }
+        path = Path(path)
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path: PathLike) -> Optional[Tuple['LabAggregate', str]]:
+        """Read a saved aggregate and its export checkpoint; None if missing or from another version"""
+        path = Path(path)
+        if not path.exists():
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            version, rows, offset, checkpoint = data['__meta__']
+            if int(version) != STATE_VERSION:
+                return None
+            aggregate = cls([str(col) for col in data['analytes']])
+            aggregate.rows = int(rows)
+            aggregate.offset = int(offset)
+            aggregate.names = [str(name) for name in data['names']]
+            aggregate._ids = {name: i for i, name in enumerate(aggregate.names)}
+            aggregate.labs = [str(lab) for lab in data['labs']]
+            aggregate._lab_ids = {lab: i for i, lab in enumerate(aggregate.labs)}
+            aggregate.samples = data['samples']
+            aggregate.valid = data['valid'].reshape(len(aggregate.names), len(aggregate.analytes))
+            aggregate.sums = data['sums'].reshape(aggregate.valid.shape)
+            aggregate.sumsq = data['sumsq'].reshape(aggregate.valid.shape)
+            aggregate.first_row = data['first_row'].reshape(len(aggregate.names), len(aggregate.labs))
+            aggregate.sketch_keys = data['sketch_keys']
+            aggregate.sketch_counts = data['sketch_counts']
+        return aggregate, str(checkpoint)
+
+
+def aggregate_range(path: PathLike, start: int, end: int, analytes: Sequence[str],
+                    chunksize: int = CHUNK_ROWS) -> LabAggregate:
+    """Aggregate one byte range of the export (rows numbered from 0 within the range)"""
+    aggregate = LabAggregate(analytes)
+    for chunk in read_results(path, analytes, chunksize, offset=start, end=end):
+        aggregate.add_chunk(chunk)
+    return aggregate
+
+
+def export_resumable(path: PathLike, offset: int, checkpoint: str) -> bool:
+    """True when the export still starts with the bytes consumed up to offset, ending on a line break"""
+    size = os.path.getsize(path)
+    if offset == 0 or size < offset:
+        return False
+    if export_checkpoint(path, offset) != checkpoint:
+        return False
+    with open(path, 'rb') as f:
+        f.seek(offset - 1)
+        return f.read(1) == b'\n' or size == offset
+
+
+def update_aggregate(path: PathLike, analytes: Sequence[str], state_path: PathLike,
+                     chunksize: int = CHUNK_ROWS, full: bool = False, workers: int = 1) -> Tuple[LabAggregate, int]:
+    """Fold the rows appended to the export since the saved watermark; returns (aggregate, new rows)
+
+    Falls back to a full pass when there is no usable state (missing, other
+    analytes, or the consumed part of the export changed) or full is set.
+    With workers > 1 the new rows are aggregated in a process pool.
+    The updated aggregate and watermark are saved back to state_path.
+    """
+    loaded = None if full else LabAggregate.load(state_path)
+    if loaded is not None and loaded[0].analytes == list(analytes) and export_resumable(path, loaded[0].offset, loaded[1]):
+        aggregate = loaded[0]
+    else:
+        aggregate = LabAggregate(analytes)
+
+    size = os.path.getsize(path)
+    rows_before = aggregate.rows
+    if size > aggregate.offset and workers > 1:
+        # Two ranges per worker evens out ranges that parse slower
+        ranges = export_ranges(path, 2 * workers, aggregate.offset)
+        for part in map_ranges(aggregate_range, path, ranges, workers, aggregate.analytes, chunksize):
+            aggregate.merge(part, row_offset=aggregate.rows)
+        aggregate.offset = size
+    elif size > aggregate.offset:
+        for chunk in read_results(path, analytes, chunksize, offset=aggregate.offset, first_row=aggregate.rows):
+            aggregate.add_chunk(chunk)
+        aggregate.offset = size
+
+    aggregate.save(state_path, export_checkpoint(path, aggregate.offset))
+    return aggregate, aggregate.rows - rows_before
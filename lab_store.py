@@ -0,0 +1,233 @@
+"""
+Partitioned Lab Results Store
+=============================
+Parquet copy of the raw lab export (results.csv), partitioned by lab and test
+year:
+
+    lab_results/lab=SC Labs/year=2017/part-3-0.parquet
+
+The analyte columns the ETL reads (EXPORT_ANALYTES) are stored as float64
+percent ('ND' / '<LOQ' style entries become NaN, as in read_results), every
+other column as text, plus the export row number. ETL reads then touch only
+the analyte columns they ask for, and lab / first-year filters skip whole
+partitions. The export must have a DATE_COLUMN.
+
+ingest_export() is incremental like update_aggregate(): the store manifest
+records the export bytes already converted, so a rerun appends only the rows
+added since; a rewritten export is converted again from scratch.
+
+pyarrow is optional - only needed when the store is used.
+
+Usage:
+    python lab_store.py results.csv [store_dir]    # convert / append to the store
+"""
+
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from lab_aggregation import (CHUNK_ROWS, LAB_COLUMN, NAME_COLUMN, LabAggregate, export_checkpoint, export_resumable,
+                             read_results)
+
+DEFAULT_STORE = 'lab_results'
+DATE_COLUMN = 'Test Date'
+ROW_COLUMN = 'row'
+MANIFEST = '_manifest.json'  # '_' prefix: not picked up as a data file
+STORE_VERSION = 2
+
+# Export columns read as readings by extract_lab_data and extract_minor_cannabinoids;
+# every other column is kept as text (read_store coerces one if asked for it)
+EXPORT_ANALYTES = (
+    'beta-Myrcene', 'delta-Limonene', 'beta-Caryophyllene', 'Linalool', 'alpha-Pinene', 'beta-Pinene',
+    'alpha-Humulene', 'Terpinolene', 'Ocimene', 'delta-9 THC', 'CBD', 'CBN',
+    'delta-9 CBG', 'THCV', 'CBC', 'CBDV',
+)
+
+PathLike = Union[str, Path]
+
+
+def _pyarrow():
+    """pyarrow, pyarrow.dataset - with a clear error when pyarrow is not installed"""
+    try:
+        import pyarrow
+        import pyarrow.dataset
+    except ImportError:
+        raise ImportError("The Parquet lab store needs pyarrow: pip install pyarrow") from None
+    return pyarrow, pyarrow.dataset
+
+
+def load_manifest(store_dir: PathLike) -> Optional[Dict]:
+    """Export watermark of the store (offset, rows, checkpoint, generation); None if there is no store"""
+    path = Path(store_dir) / MANIFEST
+    if not path.exists():
+        return None
+    with open(path) as f:
+        manifest = json.load(f)
+    return manifest if manifest.get('version') == STORE_VERSION else None
+
+
+def _save_manifest(store_dir: Path, manifest: Dict) -> None:
+    tmp_path = store_dir / (MANIFEST + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, store_dir / MANIFEST)
+
+
+def _schema(header: Sequence[str]):
+    """Arrow schema of the stored rows for an export header"""
+    pa, _ = _pyarrow()
+    fields = [pa.field(ROW_COLUMN, pa.int64())]
+    fields += [pa.field(col, pa.float64() if col in EXPORT_ANALYTES else pa.string())
+               for col in header if col != LAB_COLUMN]
+    fields += [pa.field('lab', pa.string()), pa.field('year', pa.int32())]
+    return pa.schema(fields)
+
+
+def _batches(path: PathLike, header: Sequence[str], schema, offset: int, first_row: int, chunksize: int):
+    """Record batches of the export rows from offset, typed and with their partition fields"""
+    pa, _ = _pyarrow()
+    analytes = [col for col in header if col in EXPORT_ANALYTES]
+    text_columns = [col for col in header if col not in EXPORT_ANALYTES and col not in (NAME_COLUMN, LAB_COLUMN)]
+    reader = read_results(path, analytes, chunksize, offset=offset, first_row=first_row, text_columns=text_columns)
+    for chunk in reader:
+        frame = chunk.drop(columns=[LAB_COLUMN])
+        frame.insert(0, ROW_COLUMN, chunk.index.to_numpy(dtype=np.int64))
+        frame['lab'] = chunk[LAB_COLUMN]
+        frame['year'] = pd.to_datetime(chunk[DATE_COLUMN], errors='coerce').dt.year.astype('Int32')
+        yield pa.RecordBatch.from_pandas(frame[schema.names], schema=schema, preserve_index=False)
+
+
+def ingest_export(path: PathLike, store_dir: PathLike = DEFAULT_STORE, chunksize: int = CHUNK_ROWS,
+                  full: bool = False) -> int:
+    """Append the export rows not yet in the store (all of them for a new or outdated store); returns rows added"""
+    pa, ds = _pyarrow()
+    store_dir = Path(store_dir)
+    header = list(pd.read_csv(path, nrows=0).columns)
+    if DATE_COLUMN not in header:
+        # Without it every row lands in an empty year partition and since= filters drop them all
+        raise ValueError(f"{path} has no '{DATE_COLUMN}' column - the lab store partitions by test year")
+    manifest = None if full else load_manifest(store_dir)
+    if manifest is not None and (manifest['header'] != header or
+                                 not export_resumable(path, manifest['offset'], manifest['checkpoint'])):
+        manifest = None
+    if manifest is None:
+        previous = load_manifest(store_dir)
+        if store_dir.exists():
+            shutil.rmtree(store_dir)
+        manifest = {'version': STORE_VERSION, 'header': header, 'offset': 0, 'rows': 0, 'checkpoint': '',
+                    'generation': (previous or {}).get('generation', 0) + 1, 'batch': 0}
+
+    size = os.path.getsize(path)
+    offset = manifest['offset']
+    if offset == 0:
+        with open(path, 'rb') as f:
+            f.readline()
+            offset = f.tell()
+    if size <= offset:
+        store_dir.mkdir(parents=True, exist_ok=True)
+        _save_manifest(store_dir, manifest)
+        return 0
+
+    schema = _schema(header)
+    rows = [0]
+
+    def counted():
+        for batch in _batches(path, header, schema, offset, manifest['rows'], chunksize):
+            rows[0] += batch.num_rows
+            yield batch
+
+    batch_id = manifest['batch'] + 1
+    ds.write_dataset(
+        counted(), store_dir, schema=schema, format='parquet',
+        partitioning=ds.partitioning(pa.schema([schema.field('lab'), schema.field('year')]), flavor='hive'),
+        basename_template=f'part-{batch_id}-{{i}}.parquet',
+        existing_data_behavior='overwrite_or_ignore',
+    )
+    manifest.update(offset=size, rows=manifest['rows'] + rows[0], batch=batch_id,
+                    checkpoint=export_checkpoint(path, size))
+    _save_manifest(store_dir, manifest)
+    return rows[0]
+
+
+def _filter(labs: Optional[Sequence[str]] = None, since: Optional[int] = None, min_row: int = 0):
+    """Dataset filter: partition predicates on lab / year, row-group statistics on the row number"""
+    _, ds = _pyarrow()
+    expression = ds.field(ROW_COLUMN) >= min_row
+    if labs is not None:
+        expression &= ds.field('lab').isin(list(labs))
+    if since is not None:
+        expression &= ds.field('year') >= int(since)
+    return expression
+
+
+def read_store(store_dir: PathLike, analytes: Sequence[str], labs: Optional[Sequence[str]] = None,
+               since: Optional[int] = None, min_row: int = 0) -> Iterator[pd.DataFrame]:
+    """Stream the store like read_results(): name, lab and the requested analytes, indexed by export row
+
+    Only the requested columns are read; labs (None: all) and since (first
+    test year; rows without a date are dropped) prune partitions, and min_row
+    skips row groups of rows before it. Chunks come in storage order, not
+    export order.
+    """
+    pa, ds = _pyarrow()
+    dataset = ds.dataset(store_dir, format='parquet', partitioning='hive')
+    analytes = [col for col in analytes if col in dataset.schema.names]
+    columns = [ROW_COLUMN, NAME_COLUMN, 'lab'] + analytes
+    for batch in dataset.to_batches(columns=columns, filter=_filter(labs, since, min_row)):
+        if batch.num_rows == 0:
+            continue
+        chunk = batch.to_pandas().rename(columns={'lab': LAB_COLUMN})
+        chunk.index = pd.Index(chunk.pop(ROW_COLUMN).to_numpy(dtype=np.int64))
+        for col in analytes:
+            if chunk[col].dtype == object:  # stored as text: not in EXPORT_ANALYTES
+                chunk[col] = pd.to_numeric(chunk[col], errors='coerce')
+        yield chunk[[NAME_COLUMN, LAB_COLUMN] + analytes]
+
+
+def store_checkpoint(store_dir: PathLike, labs: Optional[Sequence[str]] = None,
+                     since: Optional[int] = None) -> Tuple[str, int]:
+    """(checkpoint, rows in store) - the checkpoint names the store generation and the read filter"""
+    manifest = load_manifest(store_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"No lab store at {store_dir} - run ingest_export() first")
+    selection = json.dumps({'labs': sorted(labs) if labs is not None else None, 'since': since}, sort_keys=True)
+    return f"store:{manifest['generation']}:{selection}", manifest['rows']
+
+
+def update_store_aggregate(store_dir: PathLike, analytes: Sequence[str], state_path: PathLike, full: bool = False,
+                           labs: Optional[Sequence[str]] = None, since: Optional[int] = None) -> Tuple[LabAggregate, int]:
+    """update_aggregate() over the store: folds in only rows ingested since the saved watermark
+
+    The watermark is the store row count; a new store generation or another
+    lab / year selection starts over.
+    """
+    checkpoint, store_rows = store_checkpoint(store_dir, labs, since)
+    loaded = None if full else LabAggregate.load(state_path)
+    if loaded is not None and loaded[0].analytes == list(analytes) and loaded[1] == checkpoint:
+        aggregate = loaded[0]
+    else:
+        aggregate = LabAggregate(analytes)
+
+    rows_before = aggregate.rows
+    if store_rows > aggregate.offset:
+        for chunk in read_store(store_dir, analytes, labs, since, min_row=aggregate.offset):
+            aggregate.add_chunk(chunk)
+        aggregate.offset = store_rows
+
+    aggregate.save(state_path, checkpoint)
+    return aggregate, aggregate.rows - rows_before
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("Usage: python lab_store.py results.csv [store_dir]")
+    store = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_STORE
+    added = ingest_export(sys.argv[1], store)
+    manifest = load_manifest(store)
+    print(f"[+] Added {added:,} rows to {store} ({manifest['rows']:,} rows, generation {manifest['generation']})")
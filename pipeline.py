@@ -0,0 +1,237 @@
+"""
+ETL Pipeline Runner
+===================
+Runs the catalog build chain as stages with declared inputs and outputs:
+
+    extract  raw lab export              -> strain_database_lab_verified.csv (+ quantile table, alias map)
+    enhance  lab-verified strains        -> strain_database_lab_verified_enhanced.csv
+    master   enhanced + manual strains   -> strain_database_master.csv, strain_database_enhanced.csv
+    minor    app catalog + raw export    -> strain_database_enhanced_v2.csv (+ snapshot)
+
+Each stage is keyed by the content hash of its input files, its upstream
+outputs, its code and its parameters. A stage whose key and outputs match
+the last run is skipped; frames produced in this run are handed to the next
+stage in memory instead of being re-read from CSV. Outputs are still written,
+and since downstream keys hash them, a rerun that reproduces the same file
+stops there.
+
+Usage:
+    python pipeline.py                  # run stages whose inputs changed
+    python pipeline.py --force          # run every stage
+    python pipeline.py --full           # rebuild the lab statistics from the whole export (reruns extract)
+    python pipeline.py --whole-words    # minor cannabinoids with whole-word matching
+    python pipeline.py --aliases        # minor cannabinoids matched through the alias map
+    python pipeline.py --parallel       # scan the raw export on all CPU cores (same output)
+    python pipeline.py --store          # read the raw export through the Parquet lab store (same output)
+    python pipeline.py --since 2018     # only lab results tested in 2018 or later (implies --store)
+"""
+
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / 'scripts'))
+
+import create_master_database
+import enhance_lab_data
+import extract_lab_data
+import extract_minor_cannabinoids
+from catalog_store import build_snapshot, file_digest
+from strain_names import read_alias_map
+
+PIPELINE_STATE = ROOT / '.pipeline_state.json'
+
+Frames = Dict[str, pd.DataFrame]
+
+
+class Stage:
+    """One pipeline step: run(frames) maps the named upstream frames to its output frames
+
+    outputs maps each produced frame to the CSV it is written to; side_outputs
+    are files run() writes itself, checked like outputs. files and code are
+    read-only dependencies hashed into the stage key. A stage with rerun set
+    runs even when its key and outputs match.
+    """
+
+    def __init__(self, name: str, run: Callable[[Frames], Frames], outputs: Dict[str, str],
+                 frames: Sequence[str] = (), files: Sequence[str] = (), code: Sequence[str] = (),
+                 params: Optional[Dict] = None, after_write: Optional[Callable[[], None]] = None,
+                 side_outputs: Sequence[str] = (), rerun: bool = False):
+        self.name = name
+        self.run = run
+        self.outputs = dict(outputs)
+        self.side_outputs = list(side_outputs)
+        self.rerun = rerun
+        self.frames = list(frames)
+        self.files = list(files)
+        self.code = list(code)
+        self.params = params or {}
+        self.after_write = after_write
+
+
+# ============================================================================
+# STAGES
+# ============================================================================
+
+def run_extract(frames: Frames, workers: int = 1, store: bool = False, since: Optional[int] = None,
+                full: bool = False) -> Frames:
+    aggregate, aliases = extract_lab_data.canonicalize(
+        extract_lab_data.stream_lab_statistics(full=full, workers=workers, store=store, since=since))
+    output_df = extract_lab_data.build_lab_verified(aggregate, extract_lab_data.lab_samples(aliases, store, since))
+    extract_lab_data.write_lab_quantiles(aggregate, output_df)
+    extract_lab_data.report(output_df)
+    return {'lab_verified': output_df}
+
+
+def run_enhance(frames: Frames) -> Frames:
+    output_df = enhance_lab_data.enhance(frames['lab_verified'])
+    enhance_lab_data.report(output_df)
+    return {'lab_enhanced': output_df}
+
+
+def run_master(frames: Frames) -> Frames:
+    manual_df = pd.read_csv(create_master_database.MANUAL_PATH)
+    master_df, app_df = create_master_database.build_master(frames['lab_enhanced'], manual_df)
+    create_master_database.report(master_df)
+    return {'master': master_df, 'app': app_df}
+
+
+def run_minor(frames: Frames, whole_words: bool = False, workers: int = 1, aliases: bool = False,
+              store: bool = False, since: Optional[int] = None) -> Frames:
+    alias_map = read_alias_map(extract_lab_data.ALIASES_PATH) if aliases else None
+    enhanced_db = extract_minor_cannabinoids.add_minor_cannabinoids(
+        frames['app'], extract_minor_cannabinoids.RAW_DATA, whole_words=whole_words, workers=workers,
+        aliases=alias_map, store=extract_lab_data.LAB_STORE if store else None, since=since)
+    extract_minor_cannabinoids.report(enhanced_db)
+    return {'catalog': enhanced_db}
+
+
+def default_stages(whole_words: bool = False, workers: int = 1, aliases: bool = False, store: bool = False,
+                   since: Optional[int] = None, full: bool = False) -> List[Stage]:
+    """The catalog build chain, in run order (workers, store and full do not change outputs, so they are not hashed)
+
+    code lists each stage's modules and everything they import from the repo.
+    """
+    raw_results = str(extract_lab_data.RAW_RESULTS)
+    store = store or since is not None
+    return [
+        Stage('extract', lambda frames: run_extract(frames, workers, store, since, full),
+              outputs={'lab_verified': extract_lab_data.OUTPUT_PATH},
+              side_outputs=[extract_lab_data.QUANTILES_PATH, extract_lab_data.ALIASES_PATH],
+              files=[raw_results],
+              code=['extract_lab_data.py', 'lab_aggregation.py', 'lab_store.py', 'strain_names.py', 'strain_index.py',
+                    'catalog_store.py', 'strain_engine.py'],
+              params={'since': since}, rerun=full),
+        Stage('enhance', run_enhance,
+              outputs={'lab_enhanced': enhance_lab_data.OUTPUT_PATH},
+              frames=['lab_verified'],
+              code=['enhance_lab_data.py', 'strain_engine.py']),
+        Stage('master', run_master,
+              outputs={'master': create_master_database.MASTER_PATH, 'app': create_master_database.APP_PATH},
+              frames=['lab_enhanced'],
+              files=[create_master_database.MANUAL_PATH],
+              code=['create_master_database.py']),
+        Stage('minor', lambda frames: run_minor(frames, whole_words, workers, aliases, store, since),
+              outputs={'catalog': str(extract_minor_cannabinoids.OUTPUT_DB)},
+              frames=['app'],
+              files=[str(extract_minor_cannabinoids.RAW_DATA)] + ([extract_lab_data.ALIASES_PATH] if aliases else []),
+              code=['scripts/extract_minor_cannabinoids.py', 'lab_aggregation.py', 'lab_store.py', 'strain_index.py',
+                    'strain_names.py', 'catalog_store.py', 'strain_engine.py'],
+              params={'whole_words': whole_words, 'aliases': aliases, 'since': since},
+              after_write=lambda: print(f"[+] Snapshot saved: {build_snapshot(extract_minor_cannabinoids.OUTPUT_DB)}")),
+    ]
+
+
+# ============================================================================
+# RUNNER
+# ============================================================================
+
+def load_state(path: Path) -> Dict:
+    """Stage keys and output digests of the last run"""
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(state: Dict, path: Path) -> None:
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def run_pipeline(stages: Sequence[Stage], state_path: Path = PIPELINE_STATE, force: bool = False) -> List[str]:
+    """Run the stages whose key or outputs changed; returns the names of the stages that ran"""
+    state = load_state(state_path)
+    digests: Dict[str, str] = {}  # file path -> content digest, hashed once per run
+    frames: Frames = {}           # frames produced in this run
+    output_digests: Dict[str, str] = {}
+    output_paths: Dict[str, str] = {}
+    ran = []
+
+    def digest(path: str) -> Optional[str]:
+        if path not in digests:
+            digests[path] = file_digest(path) if os.path.exists(path) else None
+        return digests[path]
+
+    for stage in stages:
+        key_parts = {
+            'code': {path: digest(str(ROOT / path)) for path in stage.code},
+            'files': {str(path): digest(str(path)) for path in stage.files},
+            'frames': {name: output_digests[name] for name in stage.frames},
+            'params': stage.params,
+        }
+        key = hashlib.sha1(json.dumps(key_parts, sort_keys=True).encode()).hexdigest()
+        current = {name: digest(str(path)) for name, path in stage.outputs.items()}
+        side_current = {str(path): digest(str(path)) for path in stage.side_outputs}
+        output_paths.update(stage.outputs)
+
+        recorded = state.get(stage.name, {})
+        if (not force and not stage.rerun and recorded.get('key') == key and recorded.get('outputs') == current
+                and recorded.get('side_outputs', {}) == side_current):
+            print(f"[=] {stage.name}: inputs unchanged, skipped")
+            output_digests.update(current)
+            continue
+
+        print(f"\n[>] {stage.name}: running")
+        inputs = {
+            name: frames[name] if name in frames else pd.read_csv(output_paths[name])
+            for name in stage.frames
+        }
+        produced = stage.run(inputs)
+
+        for name, path in stage.outputs.items():
+            # Downstream stages get the frame as read_csv would return it: fresh RangeIndex
+            frames[name] = produced[name].reset_index(drop=True)
+            frames[name].to_csv(path, index=False)
+            digests.pop(str(path), None)
+            output_digests[name] = digest(str(path))
+            print(f"[+] {stage.name}: saved {path}")
+        if stage.after_write is not None:
+            stage.after_write()
+        for path in stage.side_outputs:
+            digests.pop(str(path), None)
+
+        state[stage.name] = {'key': key, 'outputs': {name: output_digests[name] for name in stage.outputs},
+                             'side_outputs': {str(path): digest(str(path)) for path in stage.side_outputs}}
+        save_state(state, state_path)
+        ran.append(stage.name)
+
+    return ran
+
+
+if __name__ == "__main__":
+    workers = (os.cpu_count() or 1) if '--parallel' in sys.argv else 1
+    since = int(sys.argv[sys.argv.index('--since') + 1]) if '--since' in sys.argv else None
+    stages = default_stages(whole_words='--whole-words' in sys.argv, workers=workers, aliases='--aliases' in sys.argv,
+                            store='--store' in sys.argv, since=since, full='--full' in sys.argv)
+    ran = run_pipeline(stages, force='--force' in sys.argv)
+    print(f"\nDONE - ran {len(ran)} stage(s): {', '.join(ran) if ran else 'none'}")
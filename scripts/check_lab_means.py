@@ -0,0 +1,65 @@
+"""
+Lab Means Regression Check
+==========================
+Compares the rounded means of the streaming extract (lab_aggregation +
+extract_lab_data.build_lab_verified) with the original whole-file script,
+which averaged each strain's readings with Series.mean(). Loads the whole
+export into memory - meant for sample exports.
+
+Usage:
+    python scripts/check_lab_means.py results.csv
+"""
+
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import extract_lab_data
+from extract_lab_data import analyte_map, build_lab_verified, lab_samples, output_rounding
+from lab_aggregation import NAME_COLUMN, LabAggregate, read_results
+
+
+def original_means(path):
+    """Per-strain means (decimals) as the original extract computed them; NaN below 2 readings"""
+    df = pd.read_csv(path, low_memory=False)
+    columns = [col for col in analyte_map if col in df.columns]
+    for col in columns:
+        df[col] = pd.to_numeric(df[col], errors='coerce') / 100
+
+    means = {}
+    for strain_name, group in df.groupby(NAME_COLUMN):
+        values = {analyte_map[col]: group[col].dropna() for col in columns}
+        means[strain_name] = {name: v.mean() for name, v in values.items() if len(v) >= 2}
+    return pd.DataFrame.from_dict(means, orient='index').reindex(columns=list(analyte_map.values()))
+
+
+def check(path):
+    """Number of output values that differ from the original script's"""
+    extract_lab_data.RAW_RESULTS = path
+    aggregate = LabAggregate(list(analyte_map))
+    for chunk in read_results(path, list(analyte_map)):
+        aggregate.add_chunk(chunk)
+    output_df = build_lab_verified(aggregate, lab_samples())
+
+    means = original_means(path).loc[output_df['strain_name']].fillna(0)
+    mismatches = 0
+    for column, (analytes, factor, decimals) in output_rounding.items():
+        expected = (sum(means[name] for name in analytes) * factor).round(decimals).to_numpy()
+        actual = output_df[column].to_numpy()
+        for strain_name, want, got in zip(output_df['strain_name'], expected, actual):
+            if want != got:
+                print(f"[!] {strain_name} {column}: {got} (original {want})")
+                mismatches += 1
+    return mismatches
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("Usage: python scripts/check_lab_means.py results.csv")
+    mismatches = check(sys.argv[1])
+    print("\n" + "="*60)
+    if mismatches:
+        sys.exit(f"FAILED - {mismatches} value(s) differ from the original script")
+    print("OK - every output value matches the original script")
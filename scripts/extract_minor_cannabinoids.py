@@ -7,94 +7,155 @@ Priority 1 Enhancement for StrainMatch Pro v2.0
 Author: JPXL Labs
 """
 
+import os
+import sys
 import pandas as pd
 import numpy as np
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from catalog_store import build_snapshot
+from lab_aggregation import FIXED_POINT_SCALE, NAME_COLUMN, export_ranges, map_ranges, read_results, to_fixed_point
+from lab_store import ingest_export, read_store
+from strain_index import NamePatternMatcher, fuzzy_key
+from strain_names import read_alias_map
+
+# Raw result column -> catalog column
+MINOR_CANNABINOIDS = {
+    'delta-9 CBG': 'cbg_percent',
+    'THCV': 'thcv_percent',
+    'CBC': 'cbc_percent',
+    'CBDV': 'cbdv_percent',
+}
+
 # File paths
 RAW_DATA = Path(r"C:\Projects\Terpene-Profile-Parser-for-Cannabis-Strains-master\Terpene-Profile-Parser-for-Cannabis-Strains-master\results.csv")
 CURRENT_DB = Path(r"C:\Projects\terpene_profiler_v1.3\strain_database_enhanced.csv")
 OUTPUT_DB = Path(r"C:\Projects\terpene_profiler_v1.3\strain_database_enhanced_v2.csv")
+ALIASES = Path(r"C:\Projects\terpene_profiler_v1.3\strain_aliases.csv")
+LAB_STORE = Path(r"C:\Projects\terpene_profiler_v1.3\lab_results")
 
-def load_raw_data():
-    """Load the raw lab results"""
-    print("[*] Loading raw lab data...")
-    df = pd.read_csv(RAW_DATA, low_memory=False)
-    print(f"[+] Loaded {len(df):,} test results")
-    return df
-
-def extract_cannabinoids_for_strain(raw_df, strain_name):
-    """Extract average minor cannabinoid values for a specific strain"""
-    # Normalize strain name for matching
-    strain_name_clean = strain_name.lower().strip()
-    
-    # Filter rows for this strain (case-insensitive)
-    strain_data = raw_df[raw_df['Sample Name'].str.lower().str.contains(strain_name_clean, na=False)]
-    
-    if len(strain_data) == 0:
-        return {
-            'cbg_percent': 0.0,
-            'thcv_percent': 0.0,
-            'cbc_percent': 0.0,
-            'cbdv_percent': 0.0,
-            'sample_count': 0
-        }
-    
-    # Extract cannabinoid values (convert to numeric, treating empty as 0)
-    cbg_values = pd.to_numeric(strain_data['delta-9 CBG'], errors='coerce').fillna(0)
-    thcv_values = pd.to_numeric(strain_data['THCV'], errors='coerce').fillna(0)
-    cbc_values = pd.to_numeric(strain_data['CBC'], errors='coerce').fillna(0)
-    cbdv_values = pd.to_numeric(strain_data['CBDV'], errors='coerce').fillna(0)
-    
-    # Calculate averages (only from non-zero values if they exist)
-    def safe_average(values):
-        non_zero = values[values > 0]
-        return non_zero.mean() if len(non_zero) > 0 else 0.0
-    
-    return {
-        'cbg_percent': safe_average(cbg_values),
-        'thcv_percent': safe_average(thcv_values),
-        'cbc_percent': safe_average(cbc_values),
-        'cbdv_percent': safe_average(cbdv_values),
-        'sample_count': len(strain_data)
-    }
-
-def enhance_database():
-    """Main enhancement function"""
-    print("\n[*] StrainMatch Pro v2.0 - Minor Cannabinoid Extraction")
-    print("=" * 60)
-    
-    # Load data
-    raw_df = load_raw_data()
-    current_db = pd.read_csv(CURRENT_DB)
-    
+def scan_cannabinoids(raw_path, start, end, patterns, whole_words=False, aliases=None):
+    """Sample counts, positive-reading counts and fixed-point sums per pattern over one byte range
+
+    start=0, end=None scans the whole file. Returns (rows scanned, sample_counts,
+    positive_counts, positive_sums); partial results of separate ranges add up exactly.
+    """
+    chunks = read_results(raw_path, list(MINOR_CANNABINOIDS), offset=start, end=end)
+    return scan_chunks(chunks, patterns, whole_words, aliases)
+
+def scan_chunks(chunks, patterns, whole_words=False, aliases=None):
+    """scan_cannabinoids() totals over read_results() / read_store() style chunks
+
+    With an alias map, a sample belongs to the pattern whose key equals its
+    canonical name's key instead of every pattern it contains.
+    """
+    matcher = NamePatternMatcher(patterns)
+    if aliases is not None:
+        canonical_keys = {fuzzy_key(alias): fuzzy_key(name) for alias, name in aliases.items()}
+        ids_by_key = {}
+        for i, pattern in enumerate(matcher.patterns):
+            ids_by_key.setdefault(fuzzy_key(pattern), []).append(i)
+    columns = list(MINOR_CANNABINOIDS)
+    n_strains = len(matcher.patterns)
+    sample_counts = np.zeros(n_strains, dtype=np.int64)
+    positive_counts = np.zeros((n_strains, len(columns)), dtype=np.int64)
+    positive_sums = np.zeros((n_strains, len(columns)), dtype=np.int64)
+    strains_by_sample = {}
+
+    rows = 0
+    for chunk in chunks:
+        rows += len(chunk)
+        codes, uniques = pd.factorize(chunk[NAME_COLUMN].str.lower())
+        named = codes >= 0
+        codes = codes[named]
+        values = np.column_stack([
+            chunk[col].to_numpy(dtype=np.float64)[named] if col in chunk.columns else np.zeros(len(codes))
+            for col in columns
+        ])
+        positive = values > 0
+
+        # Aggregate per distinct sample name first, then hand each total to its matching strains
+        per_name_samples = np.bincount(codes, minlength=len(uniques))
+        per_name_counts = np.zeros((len(uniques), len(columns)), dtype=np.int64)
+        per_name_sums = np.zeros((len(uniques), len(columns)), dtype=np.int64)
+        np.add.at(per_name_counts, codes, positive.astype(np.int64))
+        np.add.at(per_name_sums, codes, to_fixed_point(np.where(positive, values, 0.0)))
+
+        name_idx, strain_idx = [], []
+        for i, sample_name in enumerate(uniques):
+            strains = strains_by_sample.get(sample_name)
+            if strains is None and aliases is not None:
+                key = fuzzy_key(sample_name)
+                strains = strains_by_sample[sample_name] = ids_by_key.get(canonical_keys.get(key, key), [])
+            elif strains is None:
+                strains = strains_by_sample[sample_name] = matcher.find(sample_name, whole_words)
+            name_idx.extend([i] * len(strains))
+            strain_idx.extend(strains)
+
+        np.add.at(sample_counts, strain_idx, per_name_samples[name_idx])
+        np.add.at(positive_counts, strain_idx, per_name_counts[name_idx])
+        np.add.at(positive_sums, strain_idx, per_name_sums[name_idx])
+    return rows, sample_counts, positive_counts, positive_sums
+
+def extract_cannabinoids(strain_names, raw_path=RAW_DATA, whole_words=False, workers=1, aliases=None, store=None,
+                         since=None):
+    """Average minor cannabinoid values for every catalog strain in one pass over the raw results
+
+    A sample belongs to every strain whose lowercased name occurs in its
+    lowercased sample name (literal substring; whole_words also rejects
+    matches glued to letters or digits). Averages use only readings above 0.
+    With workers > 1 byte ranges of the raw file are scanned in a process pool.
+    With an alias map (raw name -> canonical name, see strain_names) matching
+    is an exact key lookup of the sample's canonical name instead.
+    With a store (lab_store directory, kept in step with raw_path) only the name
+    and minor cannabinoid columns are read from it, test years before since skipped.
+    """
+    patterns = [name.lower().strip() for name in strain_names]
+
+    print("[*] Streaming raw lab data...")
+    if store is not None:
+        print(f"[+] Appended {ingest_export(raw_path, store):,} export rows to the lab store")
+        chunks = read_store(store, list(MINOR_CANNABINOIDS), since=since)
+        rows, sample_counts, positive_counts, positive_sums = scan_chunks(chunks, patterns, whole_words, aliases)
+    elif workers > 1:
+        ranges = export_ranges(raw_path, 2 * workers)
+        parts = map_ranges(scan_cannabinoids, raw_path, ranges, workers, patterns, whole_words, aliases)
+        rows, sample_counts, positive_counts, positive_sums = (sum(totals) for totals in zip(*parts))
+    else:
+        rows, sample_counts, positive_counts, positive_sums = scan_cannabinoids(raw_path, 0, None, patterns, whole_words, aliases)
+    print(f"[+] Scanned {rows:,} test results")
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        averages = np.where(positive_counts > 0, positive_sums / FIXED_POINT_SCALE / positive_counts, 0.0)
+    result = pd.DataFrame(averages, columns=list(MINOR_CANNABINOIDS.values()))
+    result['sample_count'] = sample_counts
+    return result
+
+def add_minor_cannabinoids(current_db, raw_path=RAW_DATA, whole_words=False, workers=1, aliases=None, store=None,
+                           since=None):
+    """Catalog with minor cannabinoid averages and matched sample counts appended"""
     print(f"\n[*] Current database: {len(current_db)} strains")
     
     # Add new columns
     print("\n[*] Extracting minor cannabinoids...")
+    cannabinoid_df = extract_cannabinoids(current_db['strain_name'], raw_path, whole_words=whole_words, workers=workers,
+                                          aliases=aliases, store=store, since=since)
     
-    cannabinoid_data = []
-    for idx, row in current_db.iterrows():
-        strain_name = row['strain_name']
-        print(f"  Processing: {strain_name}...", end=" ")
-        
-        results = extract_cannabinoids_for_strain(raw_df, strain_name)
-        cannabinoid_data.append(results)
+    for strain_name, count in zip(current_db['strain_name'], cannabinoid_df['sample_count']):
+        print(f"  {strain_name}...", end=" ")
         
         # Show what was found
-        if results['sample_count'] > 0:
-            print(f"[+] ({results['sample_count']} samples)")
+        if count > 0:
+            print(f"[+] ({count} samples)")
         else:
             print("[!] No lab data found")
     
-    # Convert to DataFrame and merge
-    cannabinoid_df = pd.DataFrame(cannabinoid_data)
-    enhanced_db = pd.concat([current_db, cannabinoid_df], axis=1)
-    
-    # Save enhanced database
-    enhanced_db.to_csv(OUTPUT_DB, index=False)
-    print(f"\n[+] Enhanced database saved: {OUTPUT_DB}")
-    
+    # Merge
+    return pd.concat([current_db, cannabinoid_df], axis=1)
+
+def report(enhanced_db):
+    """Print per-cannabinoid coverage statistics"""
     # Generate statistics report
     print("\n[*] Enhancement Statistics:")
     print("-" * 60)
@@ -108,10 +169,35 @@ def enhance_database():
             print(f"      Avg: {avg_value:.3f}% | Max: {max_value:.3f}%")
         else:
             print(f"{cannabinoid.upper()[:4]}: No data found")
+
+def enhance_database(whole_words=False, workers=1, aliases=None, store=None, since=None):
+    """Main enhancement function"""
+    print("\n[*] StrainMatch Pro v2.0 - Minor Cannabinoid Extraction")
+    print("=" * 60)
+    
+    # Load data
+    enhanced_db = add_minor_cannabinoids(pd.read_csv(CURRENT_DB), RAW_DATA, whole_words=whole_words, workers=workers,
+                                         aliases=aliases, store=store, since=since)
+    
+    # Save enhanced database
+    enhanced_db.to_csv(OUTPUT_DB, index=False)
+    print(f"\n[+] Enhanced database saved: {OUTPUT_DB}")
+    
+    # Typed snapshot for fast app cold start (built from the CSV just written)
+    print(f"[+] Snapshot saved: {build_snapshot(OUTPUT_DB)}")
+    
+    report(enhanced_db)
     
     print("\n" + "=" * 60)
     print("[*] Next Step: Update app_v2.py to use the new database")
     print(f"    Change: load_strain_data() -> read '{OUTPUT_DB.name}'")
 
 if __name__ == "__main__":
-    enhance_database()
+    since = int(sys.argv[sys.argv.index('--since') + 1]) if '--since' in sys.argv else None
+    enhance_database(
+        whole_words='--whole-words' in sys.argv,
+        workers=(os.cpu_count() or 1) if '--parallel' in sys.argv else 1,
+        aliases=read_alias_map(ALIASES) if '--aliases' in sys.argv else None,
+        store=LAB_STORE if '--store' in sys.argv or since is not None else None,
+        since=since,
+    )
@@ -0,0 +1,408 @@
+"""
+Vectorized Strain Scoring Engine
+================================
+Compiles a SYMPTOM_PROFILES entry into weight/threshold arrays and scores the
+whole strain catalog with column-wise NumPy operations instead of one
+calculate_strain_score() call per row.
+
+Scores are accumulated in the same order as calculate_strain_score(). The
+matrix is float32 (MATRIX_DTYPE) and thresholds are compared at that precision,
+so pass/fail decisions match the per-row implementation on the CSV values and
+match_score agrees with it to float32 rounding.
+
+The same rule tables drive classification: strain type, effect and medical-use
+tags are declared as ordered rules and evaluated for a whole catalog at once.
+"""
+
+import functools
+import operator
+
+import numpy as np
+import pandas as pd
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Analyte columns held in the strain matrix (fixed column order)
+TERPENE_COLUMNS = ['myrcene', 'limonene', 'caryophyllene', 'linalool', 'pinene', 'humulene', 'terpinolene', 'ocimene']
+CANNABINOID_COLUMNS = ['thc_percent', 'cbd_percent', 'cbn_percent', 'cbg_percent', 'thcv_percent', 'cbc_percent', 'cbdv_percent']
+ANALYTE_COLUMNS = TERPENE_COLUMNS + CANNABINOID_COLUMNS + ['total_terpenes']
+ANALYTE_INDEX = {col: i for i, col in enumerate(ANALYTE_COLUMNS)}
+
+# Storage/scoring precision of the strain matrix. Thresholds are cast to the same
+# dtype before comparing, so a value recorded as 0.005 still meets a 0.005 minimum.
+MATRIX_DTYPE = np.float32
+
+# Scoring constants shared with calculate_strain_score()
+STRAIN_TYPE_BONUS = 15
+AVOID_THRESHOLD = 0.005
+AVOID_PENALTY = 10
+
+# Bonus rules: a rule awards `points` when all of its (column, operator, threshold)
+# conditions hold. Rules sharing a `group` are tiers - the first matching rule in
+# table order wins and the group's best tier counts towards the maximum score.
+# `label` is formatted with the strain's values of the condition columns.
+BONUS_RULES = [
+    {
+        "label": "✓ THC+CBD entourage (anxiety reduction)",
+        "points": 8,
+        "conditions": [("thc_percent", ">", 10), ("cbd_percent", ">", 0.5)]
+    },
+    {
+        "label": "✓ THC+Myrcene entourage (sedation boost)",
+        "points": 7,
+        "conditions": [("thc_percent", ">", 12), ("myrcene", ">", 0.005)]
+    },
+    {
+        "label": "✓ CBD+Caryophyllene (anti-inflammatory power)",
+        "points": 10,
+        "conditions": [("cbd_percent", ">", 1.0), ("caryophyllene", ">", 0.004)]
+    },
+    {
+        "label": "✓ Limonene+Linalool (calm + uplift)",
+        "points": 6,
+        "conditions": [("limonene", ">", 0.003), ("linalool", ">", 0.004)]
+    },
+    {
+        "label": "✓ CBG+CBC (brain health synergy)",
+        "points": 5,
+        "conditions": [("cbg_percent", ">", 0.3), ("cbc_percent", ">", 0.15)]
+    },
+    {
+        "label": "✓ THC+Pinene (counteracts memory loss)",
+        "points": 4,
+        "conditions": [("thc_percent", ">", 15), ("pinene", ">", 0.003)]
+    },
+    {
+        "label": "✓ Rich terpene profile ({total_terpenes:.2%} total)",
+        "points": 8,
+        "group": "terpene_content",
+        "conditions": [("total_terpenes", ">", 0.02)]
+    },
+    {
+        "label": "✓ Good terpene content ({total_terpenes:.2%})",
+        "points": 4,
+        "group": "terpene_content",
+        "conditions": [("total_terpenes", ">", 0.01)]
+    },
+]
+
+# Classification rules share the bonus rule shape: every (column, op, threshold) in
+# `conditions` must hold and, when `any_of` is given, all conditions of at least one
+# of its alternatives. Strain type: the first matching rule's label, else the default.
+STRAIN_TYPE_RULES = [
+    {"label": "Indica", "conditions": [("myrcene", ">", 0.005), ("terpinolene", "<", 0.003)]},
+    {
+        "label": "Sativa",
+        "any_of": [[("terpinolene", ">", 0.005)], [("limonene", ">", 0.008)]],
+        "conditions": [("myrcene", "<", 0.005)],
+    },
+]
+STRAIN_TYPE_DEFAULT = "Hybrid"
+
+# Tag rules: every matching label in table order; `fallback` is appended when fewer
+# than `fallback_below` tags matched, then the list is cut to `limit` tags.
+EFFECT_RULES = {
+    "limit": 3,
+    "fallback": "Happiness",
+    "fallback_below": 1,
+    "rules": [
+        {"label": "Relaxation", "conditions": [("myrcene", ">", 0.006)]},
+        {"label": "Sedation", "any_of": [[("myrcene", ">", 0.008)], [("linalool", ">", 0.010)]]},
+        {"label": "Euphoria", "any_of": [[("limonene", ">", 0.005)], [("terpinolene", ">", 0.005)]]},
+        {"label": "Energy", "conditions": [("limonene", ">", 0.008)]},
+        {"label": "Focus", "conditions": [("pinene", ">", 0.005), ("limonene", ">", 0.003)]},
+        {"label": "Creativity", "any_of": [[("limonene", ">", 0.004)], [("terpinolene", ">", 0.003)]]},
+    ],
+}
+
+MEDICAL_USE_RULES = {
+    "limit": 4,
+    "fallback": "Stress",
+    "fallback_below": 2,
+    "rules": [
+        {"label": "Pain", "any_of": [[("caryophyllene", ">", 0.006)], [("myrcene", ">", 0.006)]]},
+        {"label": "Anxiety", "any_of": [[("linalool", ">", 0.007)], [("limonene", ">", 0.005)]]},
+        {
+            "label": "Insomnia",
+            "any_of": [[("myrcene", ">", 0.007)], [("linalool", ">", 0.008), ("cbn_percent", ">", 0.15)]],
+        },
+        {"label": "Inflammation", "any_of": [[("caryophyllene", ">", 0.007)], [("cbd_percent", ">", 0.5)]]},
+        {"label": "Depression", "any_of": [[("limonene", ">", 0.007)], [("terpinolene", ">", 0.005)]]},
+    ],
+}
+
+# Comparison operators usable in rule conditions (work on scalars and arrays alike)
+RULE_OPERATORS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+}
+
+
+def _analyte_index(col: str) -> int:
+    """Position of an analyte column in the strain matrix"""
+    if col not in ANALYTE_INDEX:
+        raise ValueError(f"Unknown analyte column: {col}")
+    return ANALYTE_INDEX[col]
+
+
+def bonus_rule_groups(rules: Optional[List[Dict]] = None) -> List[List[Dict]]:
+    """Bonus rules grouped into tiers, in first-appearance order (ungrouped rules stand alone)"""
+    groups: Dict[str, List[Dict]] = {}
+    for i, rule in enumerate(BONUS_RULES if rules is None else rules):
+        groups.setdefault(rule.get('group', f"_rule_{i}"), []).append(rule)
+    return list(groups.values())
+
+
+def rule_holds(rule: Dict, column: Callable[[str], Any]) -> Any:
+    """Whether a rule's conditions (and one any_of alternative, if given) hold
+
+    column(name) supplies the analyte values to test: one strain's value for a
+    per-row check, or a strain-matrix column for a whole-catalog mask.
+    """
+    def conditions_hold(conditions):
+        return functools.reduce(operator.and_, (RULE_OPERATORS[op](column(col), threshold)
+                                                for col, op, threshold in conditions), True)
+
+    holds = conditions_hold(rule.get('conditions', []))
+    if 'any_of' in rule:
+        holds = holds & functools.reduce(operator.or_, map(conditions_hold, rule['any_of']), False)
+    return holds
+
+
+def rule_mask(matrix: np.ndarray, rule: Dict) -> np.ndarray:
+    """Boolean mask of the strains meeting a rule"""
+    # Broadcast: a rule without conditions holds for every strain
+    return np.ones(matrix.shape[0], dtype=bool) & rule_holds(rule, lambda col: matrix[:, _analyte_index(col)])
+
+
+def rule_columns(rule: Dict) -> List[str]:
+    """Analyte columns a rule tests, in order of first use"""
+    conditions = list(rule.get('conditions', []))
+    for alternative in rule.get('any_of', []):
+        conditions.extend(alternative)
+    return list(dict.fromkeys(col for col, _, _ in conditions))
+
+
+def _group_points(matrix: np.ndarray, group: List[Dict]) -> np.ndarray:
+    """Points from a tier group - the first matching rule per strain"""
+    points = np.zeros(matrix.shape[0], dtype=np.float64)
+    matched = np.zeros(matrix.shape[0], dtype=bool)
+    for rule in group:
+        hit = rule_mask(matrix, rule) & ~matched
+        points[hit] = rule['points']
+        matched |= hit
+    return points
+
+
+def match_bonus_rules(strain: pd.Series) -> List[Tuple[float, Optional[Dict]]]:
+    """Per tier group of one strain: (maximum points, matching rule or None)"""
+    results = []
+    for group in bonus_rule_groups():
+        match = None
+        for rule in group:
+            if rule_holds(rule, lambda col: strain.get(col, 0)):
+                match = rule
+                break
+        results.append((max(rule['points'] for rule in group), match))
+    return results
+
+
+def format_bonus_label(rule: Dict, strain: pd.Series) -> str:
+    """Bonus label filled in with the strain's values of the rule's condition columns"""
+    return rule['label'].format(**{col: strain.get(col, 0) for col in rule_columns(rule)})
+
+
+def build_strain_matrix(df: pd.DataFrame, dtype=MATRIX_DTYPE) -> np.ndarray:
+    """Stack the analyte columns into a (strains x ANALYTE_COLUMNS) matrix; missing columns read as 0"""
+    matrix = np.zeros((len(df), len(ANALYTE_COLUMNS)), dtype=dtype)
+    for col, i in ANALYTE_INDEX.items():
+        if col in df.columns:
+            matrix[:, i] = df[col].to_numpy(dtype=dtype)
+    return matrix
+
+
+def classify_label(matrix: np.ndarray, rules: List[Dict], default: str) -> np.ndarray:
+    """Per strain: label of the first matching rule, else the default"""
+    labels = np.full(matrix.shape[0], default, dtype=object)
+    assigned = np.zeros(matrix.shape[0], dtype=bool)
+    for rule in rules:
+        hit = rule_mask(matrix, rule) & ~assigned
+        labels[hit] = rule['label']
+        assigned |= hit
+    return labels
+
+
+def assign_tags(matrix: np.ndarray, tag_rules: Dict) -> np.ndarray:
+    """Per strain: comma-joined labels of the matching tag rules (plus fallback, cut to the limit)"""
+    rules = tag_rules['rules']
+    n = matrix.shape[0]
+    if n == 0:
+        return np.array([], dtype=object)
+    hits = np.column_stack([rule_mask(matrix, rule) for rule in rules]) if rules else np.zeros((n, 0), dtype=bool)
+
+    # Few distinct hit patterns exist - format each once and broadcast
+    patterns, inverse = np.unique(hits, axis=0, return_inverse=True)
+    joined = []
+    for pattern in patterns:
+        tags = [rule['label'] for rule, hit in zip(rules, pattern) if hit]
+        if len(tags) < tag_rules.get('fallback_below', 0):
+            tags.append(tag_rules['fallback'])
+        joined.append(','.join(tags[:tag_rules['limit']]))
+    return np.array(joined, dtype=object)[inverse.ravel()]
+
+
+def classify_strains(df: pd.DataFrame) -> pd.DataFrame:
+    """strain_type, primary_effects and medical_uses for every row, from its terpene/cannabinoid values
+
+    Evaluated at float64, i.e. on the values exactly as stored in the CSV.
+    """
+    matrix = build_strain_matrix(df, dtype=np.float64)
+    return pd.DataFrame({
+        'strain_type': classify_label(matrix, STRAIN_TYPE_RULES, STRAIN_TYPE_DEFAULT),
+        'primary_effects': assign_tags(matrix, EFFECT_RULES),
+        'medical_uses': assign_tags(matrix, MEDICAL_USE_RULES),
+    }, index=df.index)
+
+
+def compile_profile(symptom_profile: Dict) -> Dict:
+    """Compile a SYMPTOM_PROFILES entry into index, weight and threshold arrays"""
+    terps = symptom_profile.get('target_terpenes', {})
+    canns = symptom_profile.get('target_cannabinoids', {})
+
+    # Maximum attainable score, summed in calculate_strain_score() order
+    max_score = 0.0
+    for criteria in terps.values():
+        max_score += criteria['weight'] * 100
+    for criteria in canns.values():
+        max_score += abs(criteria['weight']) * 100
+    max_score += STRAIN_TYPE_BONUS
+    for group in bonus_rule_groups():
+        max_score += max(rule['points'] for rule in group)
+
+    # Cannabinoids use either a 'min' threshold or a 'preferred_range' (lo, hi)
+    cann_lo, cann_hi = [], []
+    for criteria in canns.values():
+        if 'min' in criteria:
+            cann_lo.append(criteria['min'])
+            cann_hi.append(np.inf)
+        else:
+            lo, hi = criteria.get('preferred_range', (0, 0))
+            cann_lo.append(lo)
+            cann_hi.append(hi)
+
+    return {
+        'terp_idx': np.array([_analyte_index(t) for t in terps], dtype=np.intp),
+        'terp_points': np.array([c['weight'] * 100 for c in terps.values()], dtype=np.float64),
+        'terp_min': np.array([c['min'] for c in terps.values()], dtype=np.float64),
+        'avoid_idx': np.array([_analyte_index(t) for t in symptom_profile.get('avoid_terpenes', [])], dtype=np.intp),
+        'cann_idx': np.array([_analyte_index(c) for c in canns], dtype=np.intp),
+        'cann_points': np.array([abs(c['weight']) * 100 for c in canns.values()], dtype=np.float64),
+        'cann_positive': np.array([c['weight'] > 0 for c in canns.values()], dtype=bool),
+        'cann_scored': np.array(['min' in c or 'preferred_range' in c for c in canns.values()], dtype=bool),
+        'cann_is_range': np.array(['min' not in c and 'preferred_range' in c for c in canns.values()], dtype=bool),
+        'cann_lo': np.array(cann_lo, dtype=np.float64),
+        'cann_hi': np.array(cann_hi, dtype=np.float64),
+        'strain_type': symptom_profile.get('strain_type_preference', ''),
+        'max_score': max_score,
+    }
+
+
+def _terpene_points(matrix: np.ndarray, compiled: Dict) -> np.ndarray:
+    """Per-criterion terpene points, shape (strains, target terpenes)"""
+    values = matrix[:, compiled['terp_idx']]
+    mins = compiled['terp_min'].astype(matrix.dtype)
+    points = compiled['terp_points']
+    ratio = values / mins
+    excellent = points * np.fmin(1.5, ratio)
+    partial = points * ratio
+    return np.where(values >= mins, excellent, np.where(values >= mins * 0.5, partial, 0.0))
+
+
+def _cannabinoid_points(matrix: np.ndarray, compiled: Dict) -> np.ndarray:
+    """Per-criterion cannabinoid points, shape (strains, target cannabinoids)"""
+    values = matrix[:, compiled['cann_idx']]
+    lo = compiled['cann_lo'].astype(matrix.dtype)
+    hi = compiled['cann_hi'].astype(matrix.dtype)
+    points = compiled['cann_points']
+
+    # 'min' criteria: full points at/above threshold, proportional below
+    min_points = np.where(values >= lo, points, np.fmax(0, points * (values / lo)))
+
+    # 'preferred_range' criteria: full points inside, linear falloff outside (positive weights only)
+    below = points * np.fmax(0, 1 - ((lo - values) / lo))
+    above = points * np.fmax(0, 1 - ((values - hi) / hi))
+    range_points = np.where((lo <= values) & (values <= hi), points, np.where(values < lo, below, above))
+    range_points = np.where(compiled['cann_positive'], range_points, 0.0)
+
+    block = np.where(compiled['cann_is_range'], range_points, min_points)
+    return np.where(compiled['cann_scored'], block, 0.0)
+
+
+def score_compiled(matrix: np.ndarray, strain_types: np.ndarray, compiled: Dict) -> np.ndarray:
+    """Score every strain against a compiled profile, returning normalized 0-100 match scores"""
+    score = np.zeros(matrix.shape[0], dtype=np.float64)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terp_points = _terpene_points(matrix, compiled)
+        cann_points = _cannabinoid_points(matrix, compiled)
+
+    # Accumulate column by column to keep calculate_strain_score() summation order
+    for j in range(terp_points.shape[1]):
+        score += terp_points[:, j]
+
+    for i in compiled['avoid_idx']:
+        score -= AVOID_PENALTY * (matrix[:, i] > AVOID_THRESHOLD)
+
+    for j in range(cann_points.shape[1]):
+        score += cann_points[:, j]
+
+    if compiled['strain_type']:
+        score += STRAIN_TYPE_BONUS * (strain_types == compiled['strain_type'])
+
+    for group in bonus_rule_groups():
+        score += _group_points(matrix, group)
+
+    max_score = compiled['max_score']
+    if max_score <= 0:
+        return np.zeros(matrix.shape[0], dtype=np.float64)
+    return np.minimum(100, (score / max_score) * 100)
+
+
+def score_strains(df: pd.DataFrame, symptom_profile: Dict) -> np.ndarray:
+    """Score every row of the catalog against a symptom profile"""
+    matrix = build_strain_matrix(df)
+    strain_types = df['strain_type'].to_numpy()
+    return score_compiled(matrix, strain_types, compile_profile(symptom_profile))
+
+
+def build_score_matrix(df: pd.DataFrame, symptom_profiles: Dict[str, Dict],
+                       matrix: Optional[np.ndarray] = None) -> pd.DataFrame:
+    """Score the catalog against every profile at once - a (strains x symptoms) match_score table"""
+    if matrix is None:
+        matrix = build_strain_matrix(df)
+    strain_types = df['strain_type'].to_numpy()
+    scores = {
+        symptom: score_compiled(matrix, strain_types, compile_profile(profile))
+        for symptom, profile in symptom_profiles.items()
+    }
+    return pd.DataFrame(scores, index=df.index, columns=list(symptom_profiles))
+
+
+def top_k_indices(scores: np.ndarray, names: np.ndarray, k: int) -> np.ndarray:
+    """Row positions of the k best scores, highest first, ties broken by strain name"""
+    n = len(scores)
+    k = min(k, n)
+    if k <= 0:
+        return np.array([], dtype=np.intp)
+
+    scores = np.where(np.isnan(scores), -np.inf, scores)
+
+    # Partial selection finds the k-th best score; every row at or above it is a candidate
+    kth_best = scores[np.argpartition(scores, n - k)[n - k]]
+    candidates = np.flatnonzero(scores >= kth_best)
+
+    # Order only the candidates: score descending, then name ascending
+    order = np.lexsort((np.asarray(names[candidates], dtype=str), -scores[candidates]))
+    return candidates[order[:k]]
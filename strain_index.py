@@ -0,0 +1,510 @@
+"""
+Strain Catalog Indexes
+======================
+In-memory indexes built once per catalog load, so Browse tab interactions do
+not rescan the whole catalog on every Streamlit rerun.
+
+- NameIndex: n-gram inverted index (with gram positions) answering substring name queries
+- FuzzyNameIndex: misspelling and alias lookup ranked by edit distance
+- TagIndex: packed bitsets per effect / medical-use / type tag for boolean facet filters
+- SortIndex: stable sort permutations per sortable column, applied to filter masks
+- AnalyteRangeIndex: sorted analyte columns answering range predicates by binary search
+- NamePatternMatcher: Aho-Corasick automaton finding every catalog name inside a text
+"""
+
+import threading
+from collections import defaultdict, deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from strain_engine import ANALYTE_COLUMNS
+
+_EMPTY = np.array([], dtype=np.int32)
+
+
+def normalize_name(name) -> str:
+    """Lowercased strain name as used for matching (missing names become '')"""
+    return name.lower() if isinstance(name, str) else ''
+
+
+def intersect_sorted(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Intersection of two sorted, duplicate-free position arrays (binary search of the smaller)"""
+    if len(a) > len(b):
+        a, b = b, a
+    if len(a) == 0:
+        return _EMPTY
+    pos = np.searchsorted(b, a)
+    pos[pos == len(b)] = 0
+    return a[b[pos] == a]
+
+
+class NameIndex:
+    """Inverted index of name n-grams (1 to max_gram characters) to sorted row positions
+
+    max_gram-grams also keep every occurrence as row * stride + offset, so a
+    longer query is answered by checking that its grams occur at consecutive
+    offsets - array work only, no per-name string test.
+    """
+
+    def __init__(self, names: Sequence, max_gram: int = 3, cache_size: int = 256):
+        self.max_gram = max_gram
+        self.names = [normalize_name(name) for name in names]
+        self.cache_size = cache_size
+        # Recent query results; the index is shared by every app session, hence the lock
+        self._cache: Dict[str, np.ndarray] = {}
+        self._cache_lock = threading.Lock()
+
+        # Occurrence keys row * stride + offset: offsets never reach stride
+        self.stride = max((len(name) for name in self.names), default=0) + 1
+
+        postings: Dict[str, List[int]] = defaultdict(list)
+        occurrences: Dict[str, List[int]] = defaultdict(list)
+        for pos, name in enumerate(self.names):
+            grams = {
+                name[i:i + n]
+                for n in range(1, max_gram + 1)
+                for i in range(len(name) - n + 1)
+            }
+            for gram in grams:
+                postings[gram].append(pos)
+            for i in range(len(name) - max_gram + 1):
+                occurrences[name[i:i + max_gram]].append(pos * self.stride + i)
+
+        # Rows (and offsets within a row) are visited in order, so every list is already sorted
+        self.postings = {gram: np.array(rows, dtype=np.int32) for gram, rows in postings.items()}
+        self.occurrences = {gram: np.array(keys, dtype=np.int64) for gram, keys in occurrences.items()}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def search(self, query: str) -> np.ndarray:
+        """Sorted row positions whose name contains the query (case-insensitive literal match)"""
+        query = query.lower()
+        if not query:
+            return np.arange(len(self.names), dtype=np.int32)
+
+        # Short queries are themselves an indexed gram - the posting list is the answer
+        if len(query) <= self.max_gram:
+            return self.postings.get(query, _EMPTY)
+
+        # The cache is shared across session threads: one atomic get per lookup, never
+        # a membership test followed by a read that a concurrent eviction could break
+        cached = self._cache.get(query)
+        if cached is not None:
+            return cached
+
+        # Grams at query offsets 0, n, 2n, ... and the last one cover every character
+        n = self.max_gram
+        offsets = sorted(set(range(0, len(query) - n + 1, n)) | {len(query) - n})
+        lists = sorted(((i, self.occurrences.get(query[i:i + n], _EMPTY)) for i in offsets),
+                       key=lambda item: len(item[1]))
+
+        # Match start keys, narrowed smallest-first: the gram at query offset i must
+        # occur at start + i in the same row
+        first, keys = lists[0]
+        starts = keys - first
+        for i, keys in lists[1:]:
+            if len(starts) == 0:
+                break
+            starts = intersect_sorted(starts + i, keys) - i
+
+        # Keys are sorted by row, so a row matching at several offsets is adjacent
+        rows = (starts // self.stride).astype(np.int32)
+        result = rows[np.r_[True, rows[1:] != rows[:-1]]] if len(rows) else _EMPTY
+
+        # Writers (insert + oldest-first eviction, which iterates the dict) only run under the lock
+        with self._cache_lock:
+            while self._cache and len(self._cache) >= self.cache_size:
+                self._cache.pop(next(iter(self._cache)))
+            self._cache[query] = result
+        return result
+
+
+# Common budtender shorthand -> catalog strain name
+STRAIN_ALIASES = {
+    'gsc': 'Girl Scout Cookies',
+    'girl scouts': 'Girl Scout Cookies',
+    'platinum gsc': 'Platinum Girl Scout Cookies',
+    'gdp': 'Granddaddy Purple',
+    'grand daddy': 'Granddaddy Purple',
+    'gg4': 'Gorilla Glue #4',
+    'gg 4': 'Gorilla Glue #4',
+    'gg': 'Gorilla Glue',
+    'jh': 'Jack Herer',
+    'slh': 'Super Lemon Haze',
+    'ssh': 'Super Silver Haze',
+    'sour d': 'Sour Diesel',
+    'nl': 'Northern Lights',
+    'bd': 'Blue Dream',
+    'wc': 'Wedding Cake',
+    'ww': 'White Widow',
+    'ak47': 'AK-47',
+    'dosi': 'Do-Si-Dos',
+    'dosidos': 'Do-Si-Dos',
+    'skittles': 'Zkittlez',
+}
+
+
+def fuzzy_key(name) -> str:
+    """Matching key for typo-tolerant lookup: lowercase alphanumeric words separated by single spaces"""
+    if not isinstance(name, str):
+        return ''
+    return ' '.join(''.join(ch if ch.isalnum() else ' ' for ch in name.lower()).split())
+
+
+def levenshtein(a: str, b: str, max_distance: Optional[int] = None) -> int:
+    """Edit distance (insertions, deletions, substitutions); stops early at max_distance + 1"""
+    if len(a) < len(b):
+        a, b = b, a
+    if max_distance is not None and len(a) - len(b) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if max_distance is not None and min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+def max_typo_distance(query: str) -> int:
+    """Edits tolerated for a query of this length (short queries must match exactly)"""
+    if len(query) <= 3:
+        return 0
+    if len(query) <= 5:
+        return 1
+    if len(query) <= 9:
+        return 2
+    return 3
+
+
+def padded_bigrams(key: str) -> set:
+    """Distinct bigrams of a key padded with boundary markers"""
+    padded = f"^{key}$"
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+class FuzzyNameIndex:
+    """Typo-tolerant strain lookup: bigram index over name keys plus an alias table
+
+    Candidates come from the q-gram lemma - a key within k edits of the query
+    shares at least (query bigrams - 2k) of its distinct bigrams - so only
+    those few keys get a (bounded) edit-distance check.
+    """
+
+    def __init__(self, names: Sequence, aliases: Optional[Dict[str, str]] = None):
+        self.rows_by_key: Dict[str, List[int]] = defaultdict(list)
+        for pos, name in enumerate(names):
+            key = fuzzy_key(name)
+            if key:
+                self.rows_by_key[key].append(pos)
+
+        # Aliases resolve to the rows of their target name (dropped when the target is absent)
+        self.alias_targets: Dict[str, str] = {}
+        for alias, target in (STRAIN_ALIASES if aliases is None else aliases).items():
+            alias_key, target_key = fuzzy_key(alias), fuzzy_key(target)
+            if target_key in self.rows_by_key and alias_key not in self.rows_by_key:
+                self.alias_targets[alias_key] = target_key
+
+        self.keys = list(self.rows_by_key) + list(self.alias_targets)
+        self.key_ids = {key: i for i, key in enumerate(self.keys)}
+        self.key_lengths = np.array([len(key) for key in self.keys], dtype=np.int32)
+
+        postings: Dict[str, List[int]] = defaultdict(list)
+        for i, key in enumerate(self.keys):
+            for gram in padded_bigrams(key):
+                postings[gram].append(i)
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+    def _candidates(self, key: str, max_distance: int) -> np.ndarray:
+        """Key ids passing the shared-bigram and length filters"""
+        grams = padded_bigrams(key)
+        lists = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not lists:
+            return np.array([], dtype=np.int32)
+        shared = np.bincount(np.concatenate(lists), minlength=len(self.keys))
+        required = max(1, len(grams) - 2 * max_distance)
+        close_length = np.abs(self.key_lengths - len(key)) <= max_distance
+        return np.flatnonzero((shared >= required) & close_length)
+
+    def lookup(self, query: str, limit: int = 20) -> List[Tuple[int, int]]:
+        """Ranked (row position, edit distance) matches, closest first, ties by name"""
+        key = fuzzy_key(query)
+        if not key:
+            return []
+
+        max_distance = max_typo_distance(key)
+        if max_distance == 0:
+            matches = [(0, key)] if key in self.key_ids else []
+        else:
+            matches = []
+            for i in self._candidates(key, max_distance):
+                distance = levenshtein(key, self.keys[i], max_distance)
+                if distance <= max_distance:
+                    matches.append((distance, self.keys[i]))
+
+        best: Dict[str, int] = {}
+        for distance, word in matches:
+            target = self.alias_targets.get(word, word)
+            if distance < best.get(target, distance + 1):
+                best[target] = distance
+
+        ranked = sorted(best.items(), key=lambda item: (item[1], item[0]))
+        results = [(pos, distance) for target, distance in ranked for pos in self.rows_by_key[target]]
+        return results[:limit]
+
+
+# Facet field -> comma-joined catalog column
+TAG_FIELDS = {'effect': 'primary_effects', 'use': 'medical_uses', 'type': 'strain_type'}
+
+TagTerm = Tuple[str, str]
+
+
+def split_tags(value) -> Tuple[str, ...]:
+    """Tags of a comma-joined label (missing labels have none)"""
+    if not isinstance(value, str):
+        return ()
+    return tuple(tag.strip() for tag in value.split(',') if tag.strip())
+
+
+class TagIndex:
+    """Bitmap index: one packed bitset over catalog rows per (field, tag)
+
+    Each distinct label string is parsed once; a filter such as
+    "Insomnia AND Pain AND NOT Sativa" is then a handful of bitwise ops.
+    """
+
+    def __init__(self, df: pd.DataFrame, fields: Optional[Dict[str, str]] = None):
+        self.n_rows = len(df)
+        self.vocabulary: Dict[str, List[str]] = {}
+        self.bitsets: Dict[TagTerm, np.ndarray] = {}
+        self._parsed: Dict[str, Dict[str, Tuple[str, ...]]] = {}
+
+        for field, column in (TAG_FIELDS if fields is None else fields).items():
+            if column not in df.columns:
+                continue
+            # Labels repeat heavily - parse each distinct label, then map tags back through the codes
+            codes, labels = pd.factorize(df[column])
+            parsed = {label: split_tags(label) for label in labels}
+            codes_by_tag: Dict[str, List[int]] = defaultdict(list)
+            for code, label in enumerate(labels):
+                for tag in parsed[label]:
+                    codes_by_tag[tag].append(code)
+
+            for tag, tag_codes in codes_by_tag.items():
+                self.bitsets[(field, tag)] = np.packbits(np.isin(codes, tag_codes))
+            self.vocabulary[field] = sorted(codes_by_tag)
+            self._parsed[field] = parsed
+
+        self._empty = np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+
+    def tags(self, field: str, value) -> Tuple[str, ...]:
+        """Parsed tags of one label, without re-splitting labels seen at build time"""
+        parsed = self._parsed.get(field, {})
+        return parsed[value] if value in parsed else split_tags(value)
+
+    def bitset(self, field: str, tag: str) -> np.ndarray:
+        """Packed bitset of rows carrying a tag (all zeros for an unknown tag)"""
+        return self.bitsets.get((field, tag), self._empty)
+
+    def select(self, all_of: Sequence[TagTerm] = (), none_of: Sequence[TagTerm] = ()) -> np.ndarray:
+        """Boolean row mask: every all_of tag, no none_of tag"""
+        bits = np.full_like(self._empty, 0xFF)
+        for field, tag in all_of:
+            bits &= self.bitset(field, tag)
+        for field, tag in none_of:
+            bits &= ~self.bitset(field, tag)
+        return np.unpackbits(bits, count=self.n_rows).astype(bool)
+
+
+SortKey = Tuple[str, bool]
+
+
+class SortIndex:
+    """Stable row permutation per (column, ascending) sort, computed once per catalog
+
+    A filtered, sorted view is the permutation masked by the filter, so no
+    rerun has to copy or re-sort the catalog.
+    """
+
+    def __init__(self, df: pd.DataFrame, keys: Sequence[SortKey]):
+        self.n_rows = len(df)
+        self.orders: Dict[SortKey, np.ndarray] = {}
+        self.ranks: Dict[SortKey, np.ndarray] = {}
+        for column, ascending in keys:
+            values = df[column].reset_index(drop=True)
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                # Order by label, not by category code
+                values = values.astype(object)
+            order = values.sort_values(ascending=ascending, kind='stable', na_position='last').index
+            order = np.asarray(order, dtype=np.int32)
+            rank = np.empty(self.n_rows, dtype=np.int32)
+            rank[order] = np.arange(self.n_rows, dtype=np.int32)
+            self.orders[(column, ascending)] = order
+            self.ranks[(column, ascending)] = rank
+
+    def view(self, key: SortKey, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Row positions selected by a boolean mask (all rows if None), in sort order"""
+        order = self.orders[key]
+        return order if mask is None else order[mask[order]]
+
+    def arrange(self, key: SortKey, positions: np.ndarray) -> np.ndarray:
+        """Sort a small set of row positions - O(k log k) in the number of positions"""
+        positions = np.asarray(positions, dtype=np.int32)
+        return positions[np.argsort(self.ranks[key][positions], kind='stable')]
+
+
+# Range predicate: (analyte column, operator, threshold) - the BONUS_RULES condition shape
+RangePredicate = Tuple[str, str, float]
+
+# searchsorted side of the lower / upper bound per operator (None = open end)
+_RANGE_SIDES = {
+    '>=': ('left', None),
+    '>': ('right', None),
+    '<=': (None, 'right'),
+    '<': (None, 'left'),
+    '==': ('left', 'right'),
+}
+
+
+class AnalyteRangeIndex:
+    """Each analyte column sorted once, so range predicates become binary searches
+
+    Predicates on one column are intersected as bounds; across columns the
+    most selective range is materialized and the others are checked only on
+    its rows. Thresholds are compared at the matrix precision, like scoring.
+    """
+
+    def __init__(self, matrix: np.ndarray, columns: Sequence[str] = ANALYTE_COLUMNS):
+        self.matrix = matrix
+        self.n_rows = matrix.shape[0]
+        self.column_index = {col: i for i, col in enumerate(columns)}
+        self.orders: Dict[str, np.ndarray] = {}
+        self.sorted_values: Dict[str, np.ndarray] = {}
+        self.n_valid: Dict[str, int] = {}
+        for col, i in self.column_index.items():
+            values = np.asarray(matrix[:, i])
+            # NaN sorts last and never satisfies a predicate
+            order = np.argsort(values, kind='stable').astype(np.int32)
+            self.orders[col] = order
+            self.sorted_values[col] = values[order]
+            self.n_valid[col] = int(self.n_rows - np.isnan(values).sum())
+
+    def bounds(self, col: str, op: str, threshold: float) -> Tuple[int, int]:
+        """[lo, hi) slice of the column's sort order satisfying one predicate"""
+        if col not in self.column_index:
+            raise ValueError(f"Unknown analyte column: {col}")
+        if op not in _RANGE_SIDES:
+            raise ValueError(f"Unsupported range operator: {op}")
+        values = self.sorted_values[col][:self.n_valid[col]]
+        threshold = values.dtype.type(threshold)
+        lo_side, hi_side = _RANGE_SIDES[op]
+        lo = int(np.searchsorted(values, threshold, lo_side)) if lo_side else 0
+        hi = int(np.searchsorted(values, threshold, hi_side)) if hi_side else len(values)
+        return lo, max(lo, hi)
+
+    def _column_bounds(self, predicates: Sequence[RangePredicate]) -> Dict[str, Tuple[int, int]]:
+        """Predicates folded into one [lo, hi) slice per column"""
+        merged: Dict[str, Tuple[int, int]] = {}
+        for col, op, threshold in predicates:
+            lo, hi = self.bounds(col, op, threshold)
+            if col in merged:
+                lo, hi = max(lo, merged[col][0]), min(hi, merged[col][1])
+            merged[col] = (lo, max(lo, hi))
+        return merged
+
+    def select(self, predicates: Sequence[RangePredicate]) -> np.ndarray:
+        """Sorted row positions satisfying every predicate"""
+        if not predicates:
+            return np.arange(self.n_rows, dtype=np.int32)
+
+        ranges = sorted(self._column_bounds(predicates).items(), key=lambda item: item[1][1] - item[1][0])
+        col, (lo, hi) = ranges[0]
+        rows = self.orders[col][lo:hi]
+
+        for col, (lo, hi) in ranges[1:]:
+            if len(rows) == 0:
+                break
+            if lo == 0 and hi == self.n_rows:
+                continue
+            # A predicate range always holds every copy of its end values, so checking
+            # against the slice's first and last sorted value is exact
+            sorted_values = self.sorted_values[col]
+            values = self.matrix[rows, self.column_index[col]]
+            rows = rows[(values >= sorted_values[lo]) & (values <= sorted_values[hi - 1])]
+
+        return np.sort(rows)
+
+    def mask(self, predicates: Sequence[RangePredicate]) -> np.ndarray:
+        """Boolean row mask of select()"""
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[self.select(predicates)] = True
+        return mask
+
+
+class NamePatternMatcher:
+    """Aho-Corasick automaton: all patterns occurring in a text, found in one pass over it
+
+    Matching is literal and case-sensitive - lowercase both sides for the
+    case-insensitive substring test. With whole_words, a match must not be
+    glued to a letter or digit on either side ("og kush" matches "OG Kush #2"
+    but not "dog kushy").
+    """
+
+    def __init__(self, patterns: Sequence[str]):
+        self.patterns = list(patterns)
+        self.lengths = [len(pattern) for pattern in self.patterns]
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[int]] = [[]]
+
+        # Trie of the patterns
+        for pattern_id, pattern in enumerate(self.patterns):
+            node = 0
+            for ch in pattern:
+                if ch not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[node][ch] = len(self.goto) - 1
+                node = self.goto[node][ch]
+            self.output[node].append(pattern_id)
+
+        # Failure links breadth-first; each node also reports its suffixes' patterns
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                fallback = self.fail[node]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(ch, 0) if node else 0
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+                queue.append(child)
+
+    def find(self, text: str, whole_words: bool = False) -> List[int]:
+        """Sorted ids of the patterns occurring in text"""
+        found = set(self.output[0])  # the empty pattern occurs everywhere
+        goto, fail, output = self.goto, self.fail, self.output
+        node = 0
+        for end, ch in enumerate(text, 1):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for pattern_id in output[node]:
+                if not whole_words or self._is_whole_word(text, end - self.lengths[pattern_id], end, pattern_id):
+                    found.add(pattern_id)
+        return sorted(found)
+
+    def _is_whole_word(self, text: str, start: int, end: int, pattern_id: int) -> bool:
+        """Whether text[start:end] is not glued to letters/digits beyond the pattern's own edges"""
+        pattern = self.patterns[pattern_id]
+        if not pattern:
+            return True
+        glued_left = start > 0 and text[start - 1].isalnum() and pattern[0].isalnum()
+        glued_right = end < len(text) and text[end].isalnum() and pattern[-1].isalnum()
+        return not (glued_left or glued_right)
@@ -0,0 +1,180 @@
+"""
+Strain Name Canonicalization
+============================
+Clusters the spelling variants of raw lab sample names ("Blue Dream",
+"BLUE DREAM #3", "Blue Dream - Shake") under one canonical strain name.
+
+- variant_key: matching key without flower-form words (shake, trim, pre-roll ...)
+- phonetic_code: Soundex code per word - the blocking key for misspellings
+- canonical_names: alias map {raw name: canonical name} from names and sample counts
+
+Names sharing a compact key are one cluster outright; typo merges are only
+tried between clusters in the same phonetic block, never across all pairs.
+The alias map is stored as CSV and loads into FuzzyNameIndex as aliases.
+"""
+
+import re
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Sequence, Union
+
+import pandas as pd
+
+from strain_index import fuzzy_key, levenshtein, max_typo_distance
+
+# Flower forms / lot words that keep the flower profile. Concentrate words (wax,
+# shatter, live resin, cart ...) are deliberately absent: those samples run many
+# times the flower THC / terpene levels and stay separate names.
+FORM_WORDS = {
+    'shake', 'trim', 'popcorn', 'smalls', 'buds', 'flower', 'flowers', 'preroll', 'prerolls', 'indoor', 'outdoor',
+    'lot', 'batch',
+}
+# Two-word forms, dropped only as a pair ("Pre-98 Bubba Kush" keeps its "pre")
+FORM_BIGRAMS = {('pre', 'roll'), ('pre', 'rolls')}
+
+# Markers of a phenotype / cut number: "Blue Dream #3", "No. 3", "pheno 3", "cut 3".
+# A bare trailing number ("Gelato 33") is part of the cultivar name.
+PHENO_MARKERS = {'#', 'no', 'pheno', 'phenotype', 'cut'}
+
+# Base names whose "#N" / "No. N" is a cultivar of its own, not a phenotype
+NUMBERED_CULTIVARS = {
+    'gorilla glue', 'gg', 'gelato', 'chem', 'chemdawg', 'chem dawg', 'bruce banner', 'og kush', 'thin mint',
+    'girl scout cookies', 'gsc', 'sherbert', 'sunset sherbert', 'cookies',
+}
+
+_SOUNDEX = {ch: digit for letters, digit in
+            [('bfpv', '1'), ('cgjkqsxz', '2'), ('dt', '3'), ('l', '4'), ('mn', '5'), ('r', '6')]
+            for ch in letters}
+
+PathLike = Union[str, Path]
+
+
+def _drop_forms(words: List[str]) -> List[str]:
+    """Words without flower-form words and bigrams"""
+    kept = []
+    i = 0
+    while i < len(words):
+        if tuple(words[i:i + 2]) in FORM_BIGRAMS:
+            i += 2
+            continue
+        if words[i] not in FORM_WORDS:
+            kept.append(words[i])
+        i += 1
+    return kept
+
+
+def variant_key(name) -> str:
+    """fuzzy_key without flower-form words; the plain fuzzy_key if nothing else is left"""
+    key = fuzzy_key(name)
+    words = _drop_forms(key.split())
+    return ' '.join(words) if words else key
+
+
+def phonetic_code(key: str) -> str:
+    """Soundex code of every word of a key, ignoring a plural 's' (numbers kept as they are)"""
+    codes = []
+    for word in key.split():
+        if not word[0].isalpha():
+            codes.append(word)
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        code, last = word[0], _SOUNDEX.get(word[0], '')
+        for ch in word[1:]:
+            digit = _SOUNDEX.get(ch, '')
+            if digit and digit != last:
+                code += digit
+            if ch not in 'hw':
+                last = digit
+        codes.append((code + '000')[:4])
+    return ' '.join(codes)
+
+
+def pheno_base(name) -> str:
+    """variant_key of the strain a phenotype / cut name belongs to ("Blue Dream #3" -> "blue dream"), else ''"""
+    if not isinstance(name, str):
+        return ''
+    # fuzzy_key words, with '#' kept as a word of its own
+    text = name.lower().replace('#', ' # ')
+    words = _drop_forms(''.join(ch if ch.isalnum() or ch == '#' else ' ' for ch in text).split())
+    if len(words) < 3 or not words[-1].isdigit() or words[-2] not in PHENO_MARKERS:
+        return ''
+    base = ' '.join(word for word in words[:-2] if word != '#')
+    if words[-2] in ('#', 'no') and base in NUMBERED_CULTIVARS:
+        return ''
+    return base
+
+
+def canonical_names(names: Sequence[str], counts: Sequence[int]) -> Dict[str, str]:
+    """Alias map {raw name: canonical name} for the names that are variants of another
+
+    1. Names with the same variant key ignoring spaces form one cluster.
+    2. Phenotype names ("<name> #3", "<name> pheno 3", "<name> cut 3") join the
+       cluster of <name> when it has more samples; bare numbers ("Gelato 33")
+       and NUMBERED_CULTIVARS ("Gorilla Glue #4") stay apart.
+    3. Within a phonetic block, clusters in descending sample order join the
+       first larger cluster within max_typo_distance edits (numbers must agree).
+    Each resulting group is named after its most-sampled raw spelling.
+    """
+    spellings: Dict[str, Dict[str, int]] = defaultdict(dict)
+    keys: Dict[str, str] = {}
+    bases: Dict[str, str] = {}
+    for name, count in zip(names, counts):
+        key = variant_key(name)
+        if key:
+            compact = key.replace(' ', '')
+            spellings[compact][name] = spellings[compact].get(name, 0) + int(count)
+            keys.setdefault(compact, key)
+            base = pheno_base(name)
+            if base:
+                bases.setdefault(compact, base.replace(' ', ''))
+    totals = {compact: sum(variants.values()) for compact, variants in spellings.items()}
+    parent: Dict[str, str] = {}
+
+    for compact, base in bases.items():
+        if base in totals and totals[base] > totals[compact]:
+            parent[compact] = base
+
+    blocks: Dict[str, List[str]] = defaultdict(list)
+    for compact, key in keys.items():
+        if compact not in parent:
+            blocks[phonetic_code(key)].append(compact)
+    for members in blocks.values():
+        representatives: List[str] = []
+        for compact in sorted(members, key=lambda c: (-totals[c], c)):
+            digits = re.findall(r'\d+', compact)
+            for rep in representatives:
+                limit = max_typo_distance(min(compact, rep, key=len))
+                if re.findall(r'\d+', rep) == digits and levenshtein(compact, rep, limit) <= limit:
+                    parent[compact] = rep
+                    break
+            else:
+                representatives.append(compact)
+
+    def root(compact: str) -> str:
+        while compact in parent:
+            compact = parent[compact]
+        return compact
+
+    display = {compact: min(variants.items(), key=lambda item: (-item[1], item[0]))[0]
+               for compact, variants in spellings.items() if compact not in parent}
+    aliases = {}
+    for compact, variants in spellings.items():
+        canonical = display[root(compact)]
+        for name in variants:
+            if name != canonical:
+                aliases[name] = canonical
+    return aliases
+
+
+def write_alias_map(aliases: Dict[str, str], path: PathLike) -> Path:
+    """Alias map as a two-column CSV (alias, strain_name), sorted by canonical name"""
+    table = pd.DataFrame({'alias': list(aliases), 'strain_name': list(aliases.values())})
+    table.sort_values(['strain_name', 'alias']).to_csv(path, index=False)
+    return Path(path)
+
+
+def read_alias_map(path: PathLike) -> Dict[str, str]:
+    """Alias map written by write_alias_map()"""
+    table = pd.read_csv(path, dtype=str, keep_default_na=False)
+    return dict(zip(table['alias'], table['strain_name']))